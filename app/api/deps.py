@@ -1,18 +1,22 @@
-from typing import Annotated
+from typing import Annotated, Any, AsyncGenerator, Callable, Dict, List, Optional, Sequence, Type, Union
 
-import jwt
 import structlog
-from fastapi import Depends, HTTPException, Query, status
+from fastapi import Depends, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import PyJWTError
 from pydantic import BaseModel, ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud
+from app.core.cache import response_cached, versioned_etags
 from app.core.config import settings
-from app.db.session import get_db
+from app.core.exceptions import ValidationError as AppValidationError
+from app.core.security import decode_token
+from app.core.user_cache import get_user_snapshot, set_user_snapshot
+from app.crud.base import PageResult
+from app.db.session import AsyncSessionLocal, get_db, get_read_db, open_read_session  # noqa: F401
 from app.models.user import User
-from app.schemas.token import TokenPayload
+from app.schemas.response import Page
 
 logger = structlog.get_logger()
 
@@ -22,31 +26,130 @@ reusable_oauth2 = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/login/ac
 class PaginationParams(BaseModel):
     page: int = 1
     size: int = 20
+    cursor: Optional[str] = None
+    sort: str = "id"
+    estimate_total: bool = False
 
     @property
     def skip(self) -> int:
         return (self.page - 1) * self.size
 
+    def to_page(self, items: Sequence[Any], result: PageResult) -> Page[Any]:
+        return Page(
+            items=items,
+            total=result.total,
+            total_estimated=result.total_estimated,
+            # Keyset pages have no page number
+            page=None if self.cursor else self.page,
+            size=self.size,
+            next=result.next,
+            prev=result.prev,
+        )
+
 
 async def get_pagination(
     page: Annotated[int, Query(ge=1, description="Page number")] = 1,
     size: Annotated[int, Query(ge=1, le=100, description="Page size")] = 20,
+    cursor: Annotated[
+        Optional[str], Query(description="Opaque `next`/`prev` cursor from a previous page; overrides `page`")
+    ] = None,
+    sort: Annotated[str, Query(description="Indexed column to order by")] = "id",
+    estimate_total: Annotated[
+        bool, Query(description="Return a cheap approximate `total` instead of an exact count")
+    ] = False,
 ) -> PaginationParams:
-    return PaginationParams(page=page, size=size)
+    return PaginationParams(page=page, size=size, cursor=cursor, sort=sort, estimate_total=estimate_total)
+
+
+async def get_ids(
+    ids: Annotated[Optional[str], Query(description="Comma separated ids to fetch in one request")] = None,
+) -> Optional[List[int]]:
+    if ids is None:
+        return None
+    try:
+        parsed = [int(i) for i in ids.split(",") if i.strip()]
+    except ValueError as e:
+        raise AppValidationError(detail="ids must be a comma separated list of integers") from e
+    if not parsed or len(parsed) > 100:
+        raise AppValidationError(detail="ids must contain between 1 and 100 ids")
+    return list(dict.fromkeys(parsed))
+
+
+def get_fields(schema: Type[BaseModel]) -> Callable[..., Any]:
+    """
+    Dependency factory for sparse fieldsets: `?fields=id,title` limited to the fields of `schema`.
+
+    Resolves to None when the parameter is absent (full representation).
+    """
+    allowed = list(schema.model_fields)
+
+    async def fields_dependency(
+        fields: Annotated[Optional[str], Query(description=f"Comma separated subset of: {', '.join(allowed)}")] = None,
+    ) -> Optional[List[str]]:
+        if not fields:
+            return None
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in requested if f not in allowed]
+        if unknown or not requested:
+            raise AppValidationError(detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+        # Keep the requested order, drop duplicates
+        return list(dict.fromkeys(requested))
+
+    return fields_dependency
+
+
+def dump_fields(schema: Type[BaseModel], obj: Any, fields: Optional[Sequence[str]]) -> Union[BaseModel, Dict[str, Any]]:
+    """
+    Full `schema` representation of `obj`, or only the requested `fields` as a plain dict
+    (no model validation, and no access to columns that were not loaded).
+    """
+    if fields is None:
+        return schema.model_validate(obj)
+    return {field: getattr(obj, field) for field in fields}
+
+
+async def get_cacheable_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session for endpoints wrapped in `@cache(tags=...)`: a read replica when the response will not be cached.
+
+    Cached responses are read from the primary: a write bumps the tag versions at once, and
+    a lagging replica would then have its stale rows cached under the new versions.
+    """
+    session = AsyncSessionLocal() if response_cached(request) else await open_read_session()
+    async with session:
+        yield session
+
+
+async def get_etag_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session for endpoints answering with `versioned_etag`: a read replica when ETags are not versioned.
+
+    A versioned ETag names the primary's current version of the resource, which a lagging replica may not have yet.
+    """
+    session = AsyncSessionLocal() if versioned_etags() else await open_read_session()
+    async with session:
+        yield session
 
 
 async def get_current_user(db: AsyncSession = Depends(get_db), token: str = Depends(reusable_oauth2)) -> User:
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        token_data = TokenPayload(**payload)
+        token_data = decode_token(token)
     except (PyJWTError, ValidationError) as e:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         ) from e
-    user = await crud.user.get(db, id=int(token_data.sub))  # type: ignore
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    user_id = int(token_data.sub)  # type: ignore
+    snapshot = await get_user_snapshot(user_id)
+    if snapshot is not None:
+        # Detached copy: enough for the permission checks and for serializing the user
+        user = User(**snapshot)
+    else:
+        db_user = await crud.user.get(db, id=user_id)
+        if not db_user:
+            raise HTTPException(status_code=404, detail="User not found")
+        await set_user_snapshot(db_user)
+        user = db_user
 
     # Bind user_id to the logger context
     structlog.contextvars.bind_contextvars(user_id=user.id)
@@ -1,40 +1,72 @@
-from fastapi import APIRouter, Depends
-from fastapi_cache.decorator import cache
+from typing import Any, List, Optional
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud
-from app.api.deps import PaginationParams, get_pagination
+from app.api.deps import (
+    PaginationParams,
+    dump_fields,
+    get_cacheable_read_db,
+    get_etag_read_db,
+    get_fields,
+    get_ids,
+    get_pagination,
+)
+from app.core.cache import cache, conditional_response, etag_matches, not_modified, versioned_etag
 from app.core.config import settings
 from app.core.exceptions import NotFoundError
-from app.db.session import get_db
+from app.core.export import ExportFormat, export_response, negotiate_export_format
+from app.db.session import get_db, get_read_db
 from app.schemas.item import Item as ItemSchema
 from app.schemas.item import ItemCreate
-from app.schemas.response import Page, ResponseBase
+from app.schemas.response import BulkResult, Page, ResponseBase
 
 router = APIRouter()
 
 
-@router.get("/", response_model=ResponseBase[Page[ItemSchema]])
-@cache(expire=settings.CACHE_EXPIRATION)
+# No response_model: a sparse fieldset is not a valid ItemSchema, and the full one is already validated below
+@router.get("/", response_model=None, responses={200: {"model": ResponseBase[Page[ItemSchema]]}})
+@cache(
+    expire=settings.CACHE_TAGGED_EXPIRATION,
+    tags=(crud.item.cache_tag,),
+    stale_while_revalidate=settings.CACHE_STALE_WHILE_REVALIDATE,
+)
 async def read_items(
-    pagination: PaginationParams = Depends(get_pagination), db: AsyncSession = Depends(get_db)
-) -> ResponseBase[Page[ItemSchema]]:
+    pagination: PaginationParams = Depends(get_pagination),
+    fields: Optional[List[str]] = Depends(get_fields(ItemSchema)),
+    ids: Optional[List[int]] = Depends(get_ids),
+    db: AsyncSession = Depends(get_cacheable_read_db),
+) -> Any:
     """
-    Retrieve items with pagination.
+    Retrieve items with pagination, or just the items listed in `ids`.
     """
-    # Note: fastapi-cache needs serializable objects.
+    # Note: @cache needs serializable objects.
     # SQLAlchemy models are not directly serializable by default JSON encoder.
     # However, since we return Pydantic models (ResponseBase[Page[ItemSchema]]),
     # FastAPI converts them before sending. But @cache runs on the return value of the function.
     # We must ensure the return value is Pydantic models, not ORM models mixed in.
 
-    db_items = await crud.item.get_multi(db, skip=pagination.skip, limit=pagination.size)
-    total = await crud.item.count(db)
+    if ids is not None:
+        db_items = await crud.item.get_many(db, ids=ids, fields=fields)
+        items = [dump_fields(ItemSchema, item, fields) for item in db_items]
+        return ResponseBase(data=Page(items=items, total=len(items), size=len(ids)))
 
-    # Explicitly convert ORM objects to Pydantic models
-    items = [ItemSchema.model_validate(item) for item in db_items]
+    result = await crud.item.get_page(
+        db,
+        skip=pagination.skip,
+        limit=pagination.size,
+        cursor=pagination.cursor,
+        sort=pagination.sort,
+        estimate_total=pagination.estimate_total,
+        fields=fields,
+    )
 
-    return ResponseBase(data=Page(items=items, total=total, page=pagination.page, size=pagination.size))
+    # Explicitly convert ORM objects to Pydantic models (or plain dicts for a sparse fieldset)
+    items = [dump_fields(ItemSchema, item, fields) for item in result.items]
+
+    return ResponseBase(data=pagination.to_page(items, result))
 
 
 @router.post("/", response_model=ResponseBase[ItemSchema])
@@ -46,12 +78,67 @@ async def create_item(item: ItemCreate, db: AsyncSession = Depends(get_db)) -> R
     return ResponseBase(data=db_item)
 
 
-@router.get("/{item_id}", response_model=ResponseBase[ItemSchema])
-async def read_item(item_id: int, db: AsyncSession = Depends(get_db)) -> ResponseBase[ItemSchema]:
+@router.post("/bulk", response_model=ResponseBase[BulkResult])
+async def create_items_bulk(items: List[ItemCreate], db: AsyncSession = Depends(get_db)) -> ResponseBase[BulkResult]:
+    """
+    Create many items at once, committed in chunks of `BULK_BATCH_SIZE` rows.
+    """
+    count = await crud.item.create_many(db, objs_in=items)
+    return ResponseBase(data=BulkResult(count=count))
+
+
+@router.get("/search", response_model=ResponseBase[Page[ItemSchema]])
+async def search_items(
+    q: str = Query(..., min_length=1, description="Words to look for in title and description"),
+    size: int = Query(20, ge=1, le=100, description="Page size"),
+    cursor: Optional[str] = Query(None, description="Opaque `next` cursor from a previous page"),
+    db: AsyncSession = Depends(get_read_db),
+) -> ResponseBase[Page[ItemSchema]]:
+    """
+    Full-text search over items, most relevant first.
+    """
+    result = await crud.item.search(db, q=q, limit=size, cursor=cursor)
+    items = [ItemSchema.model_validate(item) for item in result.items]
+    return ResponseBase(data=Page(items=items, total=result.total, size=size, next=result.next))
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_items(
+    request: Request,
+    format: Optional[ExportFormat] = Query(None, description="Overrides the Accept header"),
+    db: AsyncSession = Depends(get_read_db),
+) -> StreamingResponse:
+    """
+    Stream every item as NDJSON or CSV.
+    """
+    return export_response(
+        crud.item.stream(db),
+        fields=list(ItemSchema.model_fields),
+        export_format=negotiate_export_format(format, request.headers.get("accept")),
+        filename="items",
+    )
+
+
+@router.get(
+    "/{item_id}",
+    response_model=None,
+    responses={200: {"model": ResponseBase[ItemSchema]}, 304: {"description": "Not Modified"}},
+)
+async def read_item(
+    request: Request,
+    item_id: int,
+    fields: Optional[List[str]] = Depends(get_fields(ItemSchema)),
+    db: AsyncSession = Depends(get_etag_read_db),
+) -> Any:
     """
-    Get a specific item by ID.
+    Get a specific item by ID. Supports conditional requests with `If-None-Match`.
     """
-    item = await crud.item.get(db, id=item_id)
+    etag = await versioned_etag(request, crud.item.row_cache_tag(item_id))
+    if etag is not None and etag_matches(request, etag):
+        return not_modified(etag, "no-cache")
+    item = await crud.item.get(db, id=item_id, fields=fields)
     if not item:
         raise NotFoundError(detail="Item not found")
-    return ResponseBase(data=item)
+    return conditional_response(
+        request, ResponseBase(data=dump_fields(ItemSchema, item, fields)), cache_control="no-cache", etag=etag
+    )
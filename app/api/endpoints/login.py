@@ -1,7 +1,6 @@
 from datetime import timedelta
 from typing import Any
 
-import jwt
 from fastapi import APIRouter, Depends, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from jwt.exceptions import PyJWTError
@@ -15,7 +14,7 @@ from app.core.config import settings
 from app.core.exceptions import ForbiddenError, NotFoundError
 from app.core.exceptions import ValidationError as AppValidationError
 from app.core.rate_limit import limiter
-from app.schemas.token import Token, TokenPayload
+from app.schemas.token import Token
 
 router = APIRouter()
 
@@ -53,10 +52,9 @@ async def refresh_token(
     Refresh access token using a valid refresh token
     """
     try:
-        payload = jwt.decode(refresh_token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        token_data = TokenPayload(**payload)
+        token_data = security.decode_token(refresh_token)
 
-        if payload.get("type") != "refresh":
+        if token_data.type != "refresh":
             raise AppValidationError(detail="Invalid token type")
 
     except (PyJWTError, ValidationError) as e:
@@ -1,13 +1,15 @@
-from typing import Any
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, Request
-from fastapi_cache.decorator import cache
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud, models
 from app.api import deps
+from app.core.cache import cache, conditional_response, etag_matches, not_modified, versioned_etag
 from app.core.config import settings
 from app.core.exceptions import ForbiddenError, NotFoundError, ValidationError
+from app.core.export import ExportFormat, export_response, negotiate_export_format
 from app.core.rate_limit import limiter
 from app.schemas.response import Page, ResponseBase
 from app.schemas.user import User, UserCreate, UserUpdate
@@ -15,22 +17,34 @@ from app.schemas.user import User, UserCreate, UserUpdate
 router = APIRouter()
 
 
-@router.get("/", response_model=ResponseBase[Page[User]])
-@cache(expire=settings.CACHE_EXPIRATION)
+@router.get("/", response_model=None, responses={200: {"model": ResponseBase[Page[User]]}})
+@cache(
+    expire=settings.CACHE_TAGGED_EXPIRATION,
+    tags=(crud.user.cache_tag,),
+    stale_while_revalidate=settings.CACHE_STALE_WHILE_REVALIDATE,
+)
 async def read_users(
     request: Request,
-    db: AsyncSession = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_cacheable_read_db),
     pagination: deps.PaginationParams = Depends(deps.get_pagination),
+    fields: Optional[List[str]] = Depends(deps.get_fields(User)),
     current_user: models.User = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Retrieve users.
     """
-    users = await crud.user.get_multi(db, skip=pagination.skip, limit=pagination.size)
-    total = await crud.user.count(db)
-    # Convert SQLAlchemy models to Pydantic models for caching
-    users_data = [User.model_validate(u) for u in users]
-    return ResponseBase(data=Page(items=users_data, total=total, page=pagination.page, size=pagination.size))
+    result = await crud.user.get_page(
+        db,
+        skip=pagination.skip,
+        limit=pagination.size,
+        cursor=pagination.cursor,
+        sort=pagination.sort,
+        estimate_total=pagination.estimate_total,
+        fields=fields,
+    )
+    # Convert SQLAlchemy models to Pydantic models (or plain dicts for a sparse fieldset) for caching
+    users_data = [deps.dump_fields(User, u, fields) for u in result.items]
+    return ResponseBase(data=pagination.to_page(users_data, result))
 
 
 @router.post("/", response_model=ResponseBase[User])
@@ -65,21 +79,50 @@ async def read_user_me(
     return ResponseBase(data=current_user)
 
 
-@router.get("/{user_id}", response_model=ResponseBase[User])
+@router.get("/export", response_class=StreamingResponse)
+async def export_users(
+    request: Request,
+    format: Optional[ExportFormat] = Query(None, description="Overrides the Accept header"),
+    db: AsyncSession = Depends(deps.get_read_db),
+    current_user: models.User = Depends(deps.get_current_active_superuser),
+) -> StreamingResponse:
+    """
+    Stream every user as NDJSON or CSV.
+    """
+    return export_response(
+        crud.user.stream(db),
+        fields=list(User.model_fields),
+        export_format=negotiate_export_format(format, request.headers.get("accept")),
+        filename="users",
+    )
+
+
+@router.get(
+    "/{user_id}",
+    response_model=None,
+    responses={200: {"model": ResponseBase[User]}, 304: {"description": "Not Modified"}},
+)
 async def read_user_by_id(
+    request: Request,
     user_id: int,
+    fields: Optional[List[str]] = Depends(deps.get_fields(User)),
     current_user: models.User = Depends(deps.get_current_active_user),
-    db: AsyncSession = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_etag_read_db),
 ) -> Any:
     """
-    Get a specific user by id.
+    Get a specific user by id. Supports conditional requests with `If-None-Match`.
     """
-    user = await crud.user.get(db, id=user_id)
-    if user == current_user:
-        return ResponseBase(data=user)
-    if not current_user.is_superuser:
+    if user_id != current_user.id and not current_user.is_superuser:
         raise ForbiddenError(detail="The user doesn't have enough privileges")
-    return ResponseBase(data=user)
+    etag = await versioned_etag(request, crud.user.row_cache_tag(user_id))
+    if etag is not None and etag_matches(request, etag):
+        return not_modified(etag, "private, no-cache")
+    user = await crud.user.get(db, id=user_id, fields=fields)
+    if not user:
+        raise NotFoundError(detail="User not found")
+    return conditional_response(
+        request, ResponseBase(data=deps.dump_fields(User, user, fields)), cache_control="private, no-cache", etag=etag
+    )
 
 
 @router.put("/{user_id}", response_model=ResponseBase[User])
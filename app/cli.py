@@ -6,6 +6,7 @@ from alembic import command
 from alembic.config import Config
 
 from app.core.config import settings
+from app.core.metrics import prepare_multiprocess_dir
 from app.db.init_db import main as init_db
 
 
@@ -23,6 +24,9 @@ def version() -> None:
 @cli.command()
 def server() -> None:
     click.echo("Starting server...")
+    if settings.WORKERS > 1:
+        # One set of metrics for all workers, see app/core/metrics.py
+        prepare_multiprocess_dir(settings.PROMETHEUS_MULTIPROC_DIR)
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",  # nosec B104
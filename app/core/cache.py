@@ -0,0 +1,466 @@
+"""
+Response caching for endpoints, on top of the backend configured through `FastAPICache.init`.
+
+Works like `fastapi_cache.decorator.cache`, with singleflight protection against cache
+stampedes: when an entry is missing only one request per key recomputes it, while
+concurrent requests wait for that result. Within a process this is an in-memory
+future per key; across workers a short-lived Redis lock (when the backend is Redis)
+makes the other workers poll for the value instead of recomputing it.
+
+Entries can be tagged (e.g. `items`, `users:{user_id}`): every tag has a version that is
+part of the cache key, and `invalidate_tags` replaces it, which orphans all dependent entries
+at once. CRUD writes do this for their model, so list endpoints can be cached for long.
+Versions are random rather than counters, so a tag key that is lost (a flushed or evicted
+Redis, a restarted worker without one) gets a new version instead of repeating an old one.
+That lets tag keys expire after `CACHE_TAG_TTL`, instead of one living forever for every row
+ever written.
+
+Responses carry strong ETags and `If-None-Match` is answered with 304 Not Modified; for
+single resources `versioned_etag` derives the ETag from tag versions, before any query.
+
+Entries hold the final JSON body, compressed with `CACHE_COMPRESSION` above
+`CACHE_COMPRESSION_MIN_SIZE` bytes, so a hit sends the stored bytes as they are (or just
+decompresses them for clients that do not accept the coding) without re-serializing.
+"""
+
+import asyncio
+import hashlib
+import inspect
+import time
+import uuid
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence, TypeVar
+
+import orjson
+from fastapi import BackgroundTasks
+from fastapi.encoders import jsonable_encoder
+from fastapi_cache import FastAPICache
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.status import HTTP_304_NOT_MODIFIED
+
+from app.core.compression import GZIP, IDENTITY, accepts, available_encodings, compress, decompress
+from app.core.config import settings
+from app.core.logger import logger
+
+T = TypeVar("T")
+
+# Delete the lock only if we still own it
+RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one: the first caller runs the
+    function, the others await its result (or its exception).
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        future = self._inflight.get(key)
+        if future is not None:
+            # Shielded so that one cancelled waiter does not cancel the others
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fn()
+        except BaseException as e:
+            error = e if isinstance(e, Exception) else RuntimeError("Cache recomputation was cancelled")
+            future.set_exception(error)
+            # Mark retrieved: there may be no waiter
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+
+singleflight = SingleFlight()
+
+
+def request_key_builder(func: Callable[..., Any], namespace: str, request: Request) -> str:
+    """
+    Key on the endpoint and its URL (path and sorted query parameters).
+
+    Dependencies such as the authenticated user are deliberately left out: they only decide
+    whether the handler runs, not what it returns.
+    """
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    digest = hashlib.md5(f"{request.url.path}?{query}".encode(), usedforsecurity=False).hexdigest()
+    return f"{namespace}:{func.__module__}:{func.__name__}:{digest}"
+
+
+def _tag_key(tag: str) -> str:
+    return f"{FastAPICache.get_prefix()}:tag:{tag}"
+
+
+def _shared_versions() -> bool:
+    """
+    Whether tag versions are seen by every worker: with a process-local backend and several
+    workers, a write only bumps the versions of the worker that handled it.
+    """
+    return getattr(FastAPICache.get_backend(), "redis", None) is not None or settings.WORKERS <= 1
+
+
+def _new_version() -> bytes:
+    return uuid.uuid4().hex.encode()
+
+
+def _tag_ttl() -> int:
+    # Outlives the tagged entries, which a new version would orphan
+    return max(settings.CACHE_TAG_TTL, settings.CACHE_TAGGED_EXPIRATION + settings.CACHE_STALE_WHILE_REVALIDATE)
+
+
+async def _tag_versions(tags: Sequence[str]) -> str:
+    backend = FastAPICache.get_backend()
+    versions = []
+    for tag in tags:
+        key = _tag_key(tag)
+        version = await backend.get(key)
+        if version is None:
+            # Never written, or lost: start a version no existing entry or ETag was built from
+            add = getattr(backend, "add", None)
+            version = _new_version()
+            if add is not None:
+                version = await add(key, version, _tag_ttl())
+            else:
+                await backend.set(key, version, _tag_ttl())
+        versions.append(version.decode() if isinstance(version, bytes) else str(version))
+    return ".".join(versions)
+
+
+async def invalidate_tags(*tags: str) -> None:
+    """
+    Invalidate every cached entry tagged with one of `tags`, by giving the tags new versions.
+    """
+    # No response cache in this process (scripts, Celery workers)
+    if not FastAPICache._init or not tags:
+        return
+    backend = FastAPICache.get_backend()
+    versions = {_tag_key(tag): _new_version() for tag in tags}
+    try:
+        set_many = getattr(backend, "set_many", None)
+        if set_many is not None:
+            await set_many(versions, _tag_ttl())
+            return
+        for key, version in versions.items():
+            await backend.set(key, version, _tag_ttl())
+    except Exception as e:
+        logger.error(f"Failed to invalidate cache tags {tags}: {e}")
+
+
+def _uncacheable(request: Request) -> bool:
+    if not FastAPICache.get_enable():
+        return True
+    if request.method != "GET":
+        return True
+    return request.headers.get("Cache-Control") == "no-store"
+
+
+def response_cached(request: Request) -> bool:
+    """
+    Whether `cache` stores (or answers from the cache) the response to `request`.
+    """
+    return FastAPICache._init and not _uncacheable(request)
+
+
+def versioned_etags() -> bool:
+    """
+    Whether `versioned_etag` derives ETags from tag versions.
+    """
+    return FastAPICache._init and FastAPICache.get_enable() and _shared_versions()
+
+
+async def _wait_for_other_worker(redis: Any, lock_key: str, key: str) -> Optional[bytes]:
+    """
+    Poll the cache while another worker holds the lock for `key`; None if it gave up or timed out.
+    """
+    backend = FastAPICache.get_backend()
+    deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.CACHE_LOCK_POLL_INTERVAL)
+        cached = await backend.get(key)
+        if cached is not None:
+            return cached
+        if not await redis.exists(lock_key):
+            return None
+    return None
+
+
+async def _acquire_lock(redis: Any, lock_key: str) -> Optional[str]:
+    """
+    Take the recompute lock; returns the token proving ownership, or None if another worker holds it.
+    """
+    token = uuid.uuid4().hex
+    acquired = await redis.set(lock_key, token, nx=True, px=int(settings.CACHE_LOCK_TIMEOUT * 1000))
+    return token if acquired else None
+
+
+async def _release_lock(redis: Any, lock_key: str, token: str) -> None:
+    try:
+        await redis.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+    except Exception as e:
+        logger.warning(f"Failed to release cache lock '{lock_key}': {e}")
+
+
+async def _recompute(key: str, compute: Callable[[], Awaitable[bytes]]) -> bytes:
+    """
+    Run `compute` unless another worker is already doing it, in which case use its result.
+    """
+    redis = getattr(FastAPICache.get_backend(), "redis", None)
+    if redis is None:
+        return await compute()
+
+    lock_key = f"{key}:lock"
+    try:
+        token = await _acquire_lock(redis, lock_key)
+        if token is None:
+            cached = await _wait_for_other_worker(redis, lock_key, key)
+            if cached is not None:
+                return cached
+    except Exception as e:
+        logger.warning(f"Cache lock unavailable for '{key}', recomputing without it: {e}")
+        return await compute()
+
+    try:
+        return await compute()
+    finally:
+        if token is not None:
+            await _release_lock(redis, lock_key, token)
+
+
+# Keys with a stale-while-revalidate refresh scheduled in this process, until when (time.monotonic()).
+# Like the Redis lock it expires, so a refresh that never ran (e.g. the response was not sent) is retried.
+_refreshing: Dict[str, float] = {}
+
+
+def _claim_refresh(key: str) -> bool:
+    now = time.monotonic()
+    if _refreshing.get(key, 0.0) > now:
+        return False
+    for expired in [k for k, until in _refreshing.items() if until <= now]:
+        del _refreshing[expired]
+    _refreshing[key] = now + settings.CACHE_LOCK_TIMEOUT
+    return True
+
+
+async def _refresh(key: str, compute: Callable[[], Awaitable[bytes]]) -> None:
+    """
+    Background refresh of a stale entry; skipped if another worker is already refreshing it.
+    """
+    try:
+        redis = getattr(FastAPICache.get_backend(), "redis", None)
+        if redis is None:
+            await singleflight.do(key, compute)
+            return
+        lock_key = f"{key}:lock"
+        token = await _acquire_lock(redis, lock_key)
+        if token is None:
+            return
+        try:
+            await singleflight.do(key, compute)
+        finally:
+            await _release_lock(redis, lock_key, token)
+    except Exception as e:
+        # The stale entry keeps being served until its hard TTL
+        logger.warning(f"Failed to refresh stale cache key '{key}': {e}")
+    finally:
+        _refreshing.pop(key, None)
+
+
+def make_etag(data: bytes) -> str:
+    """
+    Strong ETag for a representation.
+    """
+    return f'"{hashlib.blake2b(data, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Whether `If-None-Match` lists `etag` (weak comparison, as RFC 9110 prescribes for it) or is `*`.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+async def versioned_etag(request: Request, *tags: str) -> Optional[str]:
+    """
+    ETag of the representation at this URL derived from the versions of `tags`, without loading it.
+
+    Only valid for resources written through CRUDBase (see `invalidate_tags`); None when the
+    versions are not available, in which case `conditional_response` hashes the body instead.
+    """
+    if not versioned_etags():
+        return None
+    try:
+        versions = await _tag_versions(tags)
+    except Exception as e:
+        logger.warning(f"Failed to read cache tag versions for {tags}: {e}")
+        return None
+    return make_etag(f"{request.url.path}?{request.url.query}:{versions}".encode())
+
+
+def _render_json(content: Any) -> bytes:
+    return orjson.dumps(jsonable_encoder(content))
+
+
+def conditional_response(request: Request, content: Any, *, cache_control: str, etag: Optional[str] = None) -> Response:
+    """
+    Serialize `content`, or answer 304 if the client already has it.
+    """
+    body = _render_json(content)
+    etag = etag or make_etag(body)
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    return Response(body, media_type="application/json", headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    encoding: str
+    etag: str
+    media_type: str
+
+
+def _pack(body: bytes, media_type: str) -> bytes:
+    """
+    Serialize a response body for the cache: a JSON metadata line, then the (compressed) body.
+    """
+    encoding = IDENTITY
+    if settings.CACHE_COMPRESSION != IDENTITY and len(body) >= settings.CACHE_COMPRESSION_MIN_SIZE:
+        encoding = settings.CACHE_COMPRESSION if settings.CACHE_COMPRESSION in available_encodings() else GZIP
+    meta = {"encoding": encoding, "etag": make_etag(body), "media_type": media_type}
+    return orjson.dumps(meta) + b"\n" + compress(body, encoding)
+
+
+def _unpack(data: bytes) -> CachedResponse:
+    meta, _, body = data.partition(b"\n")
+    return CachedResponse(body=body, **orjson.loads(meta))
+
+
+def _cached_response(request: Request, entry: CachedResponse, headers: Dict[str, str]) -> Response:
+    encoded = entry.encoding != IDENTITY and accepts(request.headers.get("accept-encoding"), entry.encoding)
+    # A strong ETag names one byte sequence, so the encoded body only gets a weak one
+    etag = f"W/{entry.etag}" if encoded else entry.etag
+    if etag_matches(request, entry.etag):
+        return not_modified(etag, headers["Cache-Control"])
+    headers = {**headers, "ETag": etag, "Vary": "Accept-Encoding"}
+    body = entry.body
+    if encoded:
+        headers["Content-Encoding"] = entry.encoding
+    elif entry.encoding != IDENTITY:
+        body = decompress(body, entry.encoding)
+    return Response(body, media_type=entry.media_type, headers=headers)
+
+
+def cache(
+    expire: Optional[int] = None,
+    namespace: str = "",
+    tags: Sequence[str] = (),
+    stale_while_revalidate: int = 0,
+) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+    """
+    Cache the JSON response of a GET endpoint for `expire` seconds, or until one of `tags` is invalidated.
+
+    Tags may reference path parameters, e.g. `users:{user_id}`. With `stale_while_revalidate`,
+    an entry older than `expire` is still served for that many more seconds while it is
+    refreshed after the response is sent, so only entries past this hard TTL cost a recompute.
+    """
+
+    def wrapper(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        signature = inspect.signature(func)
+        parameters = list(signature.parameters.values())
+        injected: List[inspect.Parameter] = []
+
+        def locate(annotation: type, name: str) -> str:
+            for param in parameters:
+                if param.annotation is annotation:
+                    return param.name
+            injected.append(inspect.Parameter(name, inspect.Parameter.KEYWORD_ONLY, annotation=annotation))
+            return name
+
+        request_name = locate(Request, "__cache_request")
+        background_name = locate(BackgroundTasks, "__cache_background_tasks")
+        injected_names = {param.name for param in injected}
+
+        @wraps(func)
+        async def inner(*args: Any, **kwargs: Any) -> Any:
+            request: Request = kwargs[request_name]
+            background_tasks: BackgroundTasks = kwargs[background_name]
+            call_kwargs = {k: v for k, v in kwargs.items() if k not in injected_names}
+
+            if _uncacheable(request):
+                return await func(*args, **call_kwargs)
+
+            backend = FastAPICache.get_backend()
+            ttl = expire or FastAPICache.get_expire() or settings.CACHE_EXPIRATION
+            if tags and not _shared_versions():
+                # Writes handled by other workers would not invalidate this entry
+                ttl = min(ttl, settings.CACHE_EXPIRATION)
+            # Entries are kept in the backend until the hard TTL, and are stale once fewer than
+            # `stale_while_revalidate` seconds of it remain
+            hard_ttl = ttl + stale_while_revalidate
+            key = request_key_builder(func, f"{FastAPICache.get_prefix()}:{namespace}", request)
+
+            try:
+                if tags:
+                    key += ":v" + await _tag_versions([tag.format(**request.path_params) for tag in tags])
+                remaining, cached = await backend.get_with_ttl(key)
+            except Exception as e:
+                logger.warning(f"Error retrieving cache key '{key}': {e}")
+                # Without the tag versions the entry might be stale
+                return await func(*args, **call_kwargs)
+
+            async def compute() -> bytes:
+                data = _pack(_render_json(await func(*args, **call_kwargs)), "application/json")
+                try:
+                    await backend.set(key, data, hard_ttl)
+                except Exception as e:
+                    logger.warning(f"Error setting cache key '{key}': {e}")
+                return data
+
+            status = "HIT"
+            if cached is None or request.headers.get("Cache-Control") == "no-cache":
+                status = "MISS"
+                remaining = hard_ttl
+                cached = await singleflight.do(key, lambda: _recompute(key, compute))
+            elif 0 <= remaining < stale_while_revalidate:
+                status = "STALE"
+                if _claim_refresh(key):
+                    # Runs after the response is sent, while the request's dependencies (db session) are still open
+                    background_tasks.add_task(_refresh, key, compute)
+
+            # Tagged entries can be invalidated at any time: let clients revalidate instead of reusing them blindly
+            if tags:
+                cache_control = "no-cache"
+            elif stale_while_revalidate:
+                max_age = max(remaining - stale_while_revalidate, 0)
+                cache_control = f"max-age={max_age}, stale-while-revalidate={stale_while_revalidate}"
+            else:
+                cache_control = f"max-age={remaining}"
+            headers = {"Cache-Control": cache_control, FastAPICache.get_cache_status_header(): status}
+            return _cached_response(request, _unpack(cached), headers)
+
+        inner.__signature__ = signature.replace(parameters=[*parameters, *injected])  # type: ignore[attr-defined]
+        return inner
+
+    return wrapper
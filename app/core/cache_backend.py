@@ -0,0 +1,270 @@
+"""
+Two-tier cache backend for `FastAPICache`: a bounded in-process LRU in front of Redis.
+
+Local entries live for at most `CACHE_LOCAL_TTL` seconds, so most hits never leave the
+process. Writes and clears are published on `CACHE_INVALIDATION_CHANNEL`, and every worker
+drops its local copy of the affected keys, so workers stay coherent well within that TTL.
+Without Redis the local tier is the whole cache, still bounded in entries and bytes.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from fastapi_cache.backends import Backend
+from prometheus_client import Counter, Gauge
+
+from app.core.config import settings
+from app.core.logger import logger
+
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by tier and result", ["tier", "result"])
+CACHE_EVICTIONS = Counter("cache_evictions_total", "Entries removed from the local cache", ["reason"])
+CACHE_LOCAL_ENTRIES = Gauge("cache_local_entries", "Entries in the local cache", multiprocess_mode="livesum")
+CACHE_LOCAL_BYTES = Gauge("cache_local_bytes", "Size of the values in the local cache", multiprocess_mode="livesum")
+
+
+class _Entry(NamedTuple):
+    value: bytes
+    # Until when the local copy may be served, and until when the entry itself is valid
+    local_expires_at: float
+    expires_at: float
+
+
+class LocalCache:
+    """
+    LRU cache bounded by number of entries and total value size, with per-entry expiry.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        return self._bytes
+
+    def get(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.local_expires_at <= time.monotonic():
+            self._remove(key, "expired")
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, value: bytes, local_ttl: float, ttl: Optional[float] = None) -> None:
+        if len(value) > self.max_bytes:
+            # Would evict everything else and still not fit
+            self.delete(key)
+            return
+        now = time.monotonic()
+        expires_at = now + ttl if ttl is not None else float("inf")
+        self.delete(key)
+        self._entries[key] = _Entry(value, min(now + local_ttl, expires_at), expires_at)
+        self._bytes += len(value)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)), "size")
+        self._update_gauges()
+
+    def delete(self, key: str) -> None:
+        if key in self._entries:
+            self._remove(key, "invalidated")
+
+    def delete_prefix(self, prefix: str) -> None:
+        for key in [k for k in self._entries if k.startswith(prefix)]:
+            self._remove(key, "invalidated")
+
+    def clear(self) -> None:
+        for key in list(self._entries):
+            self._remove(key, "invalidated")
+
+    def _remove(self, key: str, reason: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.value)
+        CACHE_EVICTIONS.labels(reason=reason).inc()
+        self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        CACHE_LOCAL_ENTRIES.set(len(self._entries))
+        CACHE_LOCAL_BYTES.set(self._bytes)
+
+
+def _to_bytes(value: Any) -> Optional[bytes]:
+    # Clients created with decode_responses=True hand back str
+    if isinstance(value, str):
+        return value.encode()
+    return value  # type: ignore[no-any-return]
+
+
+class TieredBackend(Backend):
+    """
+    `FastAPICache` backend reading through a `LocalCache` to Redis (if given).
+    """
+
+    def __init__(self, redis: Optional[Any] = None) -> None:
+        self.redis = redis
+        self.local = LocalCache(settings.CACHE_LOCAL_MAX_ENTRIES, settings.CACHE_LOCAL_MAX_BYTES)
+        # Lets a worker ignore its own invalidation messages
+        self._id = uuid.uuid4().hex
+        self._listener: Optional["asyncio.Task[None]"] = None
+
+    async def start(self) -> None:
+        """
+        Subscribe to invalidations from the other workers; raises if Redis is unreachable.
+        """
+        if self.redis is None:
+            return
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+        self._listener = asyncio.create_task(self._listen(pubsub))
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self, pubsub: Any) -> None:
+        try:
+            while True:
+                try:
+                    async for message in pubsub.listen():
+                        self._apply(_to_bytes(message["data"]) or b"")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Local entries expire on their own within CACHE_LOCAL_TTL in the meantime
+                    logger.warning(f"Cache invalidation listener failed, resubscribing: {e}")
+                    await asyncio.sleep(1)
+                    await pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+        finally:
+            await pubsub.reset()
+
+    def _apply(self, message: bytes) -> None:
+        sender, kind, target = message.decode().split(" ", 2)
+        if sender == self._id:
+            return
+        if kind == "prefix":
+            self.local.delete_prefix(target)
+        else:
+            self.local.delete(target)
+
+    async def _publish(self, kind: str, *targets: str) -> None:
+        try:
+            if len(targets) == 1:
+                message = f"{self._id} {kind} {targets[0]}"
+                await self.redis.publish(settings.CACHE_INVALIDATION_CHANNEL, message)  # type: ignore[union-attr]
+                return
+            async with self.redis.pipeline(transaction=False) as pipe:  # type: ignore[union-attr]
+                for target in targets:
+                    pipe.publish(settings.CACHE_INVALIDATION_CHANNEL, f"{self._id} {kind} {target}")
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to publish cache invalidation for {targets}: {e}")
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        entry = self.local.get(key)
+        if entry is not None:
+            CACHE_REQUESTS.labels(tier="local", result="hit").inc()
+            ttl = entry.expires_at - time.monotonic()
+            return (int(ttl) if ttl != float("inf") else -1), entry.value
+        CACHE_REQUESTS.labels(tier="local", result="miss").inc()
+        if self.redis is None:
+            return 0, None
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            ttl, value = await pipe.ttl(key).get(key).execute()
+        value = _to_bytes(value)
+        if value is None:
+            CACHE_REQUESTS.labels(tier="redis", result="miss").inc()
+            return 0, None
+        CACHE_REQUESTS.labels(tier="redis", result="hit").inc()
+        self.local.set(key, value, settings.CACHE_LOCAL_TTL, ttl if ttl >= 0 else None)
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return (await self.get_with_ttl(key))[1]
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        if self.redis is None:
+            self.local.set(key, value, expire or float("inf"), expire)
+            return
+        await self.redis.set(key, value, ex=expire)
+        self.local.set(key, value, settings.CACHE_LOCAL_TTL, expire)
+        await self._publish("key", key)
+
+    async def set_many(self, values: Dict[str, bytes], expire: Optional[int] = None) -> None:
+        """
+        `set` for several keys, sent to Redis in one pipeline.
+        """
+        if self.redis is None:
+            for key, value in values.items():
+                self.local.set(key, value, expire or float("inf"), expire)
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, value in values.items():
+                pipe.set(key, value, ex=expire)
+            await pipe.execute()
+        for key, value in values.items():
+            self.local.set(key, value, settings.CACHE_LOCAL_TTL, expire)
+        await self._publish("key", *values)
+
+    async def add(self, key: str, value: bytes, expire: Optional[int] = None) -> bytes:
+        """
+        Set `key` only if it has no value yet, and return the value it ends up with.
+        """
+        if self.redis is None:
+            entry = self.local.get(key)
+            if entry is not None:
+                return entry.value
+            self.local.set(key, value, expire or float("inf"), expire)
+            return value
+        async with self.redis.pipeline(transaction=True) as pipe:
+            added, stored = await pipe.set(key, value, ex=expire, nx=True).get(key).execute()
+        stored = _to_bytes(stored) or value
+        self.local.set(key, stored, settings.CACHE_LOCAL_TTL, expire)
+        if added:
+            await self._publish("key", key)
+        return stored
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        if namespace:
+            self.local.delete_prefix(f"{namespace}:")
+        elif key:
+            self.local.delete(key)
+        else:
+            return 0
+        if self.redis is None:
+            return 0
+
+        if namespace:
+            lua = f"for i, name in ipairs(redis.call('KEYS', '{namespace}:*')) do redis.call('DEL', name); end"
+            removed = await self.redis.eval(lua, 0)
+            await self._publish("prefix", f"{namespace}:")
+        else:
+            removed = await self.redis.delete(key)
+            await self._publish("key", key)  # type: ignore[arg-type]
+        return removed or 0
+
+    async def delete(self, *keys: str) -> int:
+        """
+        Remove several keys from both tiers with one DEL, and drop every worker's local copies.
+        """
+        for key in keys:
+            self.local.delete(key)
+        if self.redis is None or not keys:
+            return 0
+        removed: int = await self.redis.delete(*keys)
+        await self._publish("key", *keys)
+        return removed
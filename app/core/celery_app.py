@@ -10,4 +10,15 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    # Bound the broker/result connections like the application's own Redis pools
+    broker_pool_limit=settings.REDIS_MAX_CONNECTIONS,
+    redis_max_connections=settings.REDIS_MAX_CONNECTIONS,
+    redis_socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    redis_socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+    broker_transport_options={
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": settings.REDIS_CONNECT_TIMEOUT,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL,
+    },
 )
@@ -0,0 +1,153 @@
+"""
+Content codings for response bodies.
+
+gzip is always available; zstd and br need the `zstandard` and `brotli` packages (listed in
+requirements.txt), and are not offered when those are missing.
+Levels come from the `COMPRESSION_*_LEVEL` settings unless given.
+"""
+
+import gzip
+import zlib
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None  # type: ignore[assignment]
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+IDENTITY = "identity"
+GZIP = "gzip"
+ZSTD = "zstd"
+BROTLI = "br"
+
+
+def available_encodings() -> List[str]:
+    """
+    Supported codings, preferred first.
+    """
+    encodings = []
+    if zstandard is not None:
+        encodings.append(ZSTD)
+    if brotli is not None:
+        encodings.append(BROTLI)
+    encodings.append(GZIP)
+    return encodings
+
+
+def default_level(encoding: str) -> int:
+    levels = {
+        GZIP: settings.COMPRESSION_GZIP_LEVEL,
+        ZSTD: settings.COMPRESSION_ZSTD_LEVEL,
+        BROTLI: settings.COMPRESSION_BROTLI_LEVEL,
+    }
+    return levels.get(encoding, 0)
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if level is None:
+        level = default_level(encoding)
+    if encoding == GZIP:
+        # mtime=0 keeps the output deterministic
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == ZSTD and zstandard is not None:
+        compressed: bytes = zstandard.ZstdCompressor(level=level).compress(data)
+        return compressed
+    if encoding == BROTLI and brotli is not None:
+        compressed = brotli.compress(data, quality=level)
+        return compressed
+    if encoding == IDENTITY:
+        return data
+    raise ValueError(f"Unsupported content coding '{encoding}'")
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == GZIP:
+        return gzip.decompress(data)
+    if encoding == ZSTD and zstandard is not None:
+        # Streamed frames do not record their content size, which the one-shot API needs
+        decompressed: bytes = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        return decompressed
+    if encoding == BROTLI and brotli is not None:
+        decompressed = brotli.decompress(data)
+        return decompressed
+    if encoding == IDENTITY:
+        return data
+    raise ValueError(f"Unsupported content coding '{encoding}'")
+
+
+class StreamCompressor:
+    """
+    Incremental compression of a body sent in chunks; every chunk is flushed so the client can
+    decode it as soon as it arrives.
+    """
+
+    def __init__(self, encoding: str, level: Optional[int] = None):
+        if level is None:
+            level = default_level(encoding)
+        self.encoding = encoding
+        self._compressor: Any
+        if encoding == GZIP:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif encoding == ZSTD and zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        elif encoding == BROTLI and brotli is not None:
+            self._compressor = brotli.Compressor(quality=level)
+        else:
+            raise ValueError(f"Unsupported content coding '{encoding}'")
+
+    def compress(self, data: bytes, final: bool = False) -> bytes:
+        if self.encoding == GZIP:
+            flush_mode = zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+            return bytes(self._compressor.compress(data) + self._compressor.flush(flush_mode))
+        if self.encoding == ZSTD:
+            flush_mode = zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            return bytes(self._compressor.compress(data) + self._compressor.flush(flush_mode))
+        chunk = self._compressor.process(data)
+        return bytes(chunk + (self._compressor.finish() if final else self._compressor.flush()))
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """
+    Map each coding listed in an Accept-Encoding header to its q-value.
+    """
+    accepted: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def accepts(header: Optional[str], encoding: str) -> bool:
+    accepted = parse_accept_encoding(header)
+    return accepted.get(encoding, accepted.get("*", 0.0)) > 0
+
+
+def negotiate(header: Optional[str], encodings: Optional[List[str]] = None) -> Optional[str]:
+    """
+    The coding of `encodings` (default: the available ones, in order of preference) the client
+    ranks highest, or None if it accepts none of them.
+    """
+    accepted = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for encoding in encodings if encodings is not None else available_encodings():
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
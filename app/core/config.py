@@ -1,7 +1,20 @@
-from typing import List, Optional, Union
+import os
+import tempfile
+from typing import Annotated, List, Optional, Union
 
 from pydantic import AnyHttpUrl, field_validator
-from pydantic_settings import BaseSettings, SettingsConfigDict
+from pydantic_settings import BaseSettings, NoDecode, SettingsConfigDict
+
+
+def normalize_db_url(url: str) -> str:
+    """Force the async driver for Postgres and SQLite URLs."""
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("sqlite://") and not url.startswith("sqlite+aiosqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
 
 
 class Settings(BaseSettings):
@@ -14,13 +27,21 @@ class Settings(BaseSettings):
     @field_validator("DATABASE_URL", mode="before")
     @classmethod
     def assemble_db_connection(cls, v: str) -> str:
-        if v.startswith("postgres://"):
-            return v.replace("postgres://", "postgresql+asyncpg://", 1)
-        if v.startswith("postgresql://"):
-            return v.replace("postgresql://", "postgresql+asyncpg://", 1)
-        if v.startswith("sqlite://") and not v.startswith("sqlite+aiosqlite://"):
-            return v.replace("sqlite://", "sqlite+aiosqlite://", 1)
-        return v
+        return normalize_db_url(v)
+
+    # Read replicas (Comma separated list of URLs), used by `get_read_db`
+    DATABASE_REPLICA_URLS: Annotated[List[str], NoDecode] = []
+    # Seconds a replica that failed to connect is left out of rotation
+    DB_REPLICA_RETRY_INTERVAL: int = 30
+    # Seconds to wait for a pooled replica connection before failing over to the next replica or the primary
+    DB_REPLICA_POOL_TIMEOUT: float = 1.0
+
+    @field_validator("DATABASE_REPLICA_URLS", mode="before")
+    @classmethod
+    def assemble_replica_connections(cls, v: Union[str, List[str]]) -> List[str]:
+        if isinstance(v, str):
+            v = [i.strip() for i in v.split(",") if i.strip()]
+        return [normalize_db_url(url) for url in v]
 
     # Database Pool
     DB_POOL_SIZE: int = 5
@@ -28,14 +49,48 @@ class Settings(BaseSettings):
     DB_POOL_TIMEOUT: int = 30
     DB_POOL_RECYCLE: int = 1800
 
+    # Warm-up before reporting ready, see app/core/warmup.py
+    WARMUP_ENABLED: bool = True
+    # Comma separated paths (with query strings) requested in-process at startup
+    WARMUP_ROUTES: Annotated[List[str], NoDecode] = ["/api/v1/items/"]
+    WARMUP_TIMEOUT: float = 30.0  # seconds
+
+    @field_validator("WARMUP_ROUTES", mode="before")
+    @classmethod
+    def assemble_warmup_routes(cls, v: Union[str, List[str]]) -> List[str]:
+        if isinstance(v, str):
+            return [i.strip() for i in v.split(",") if i.strip()]
+        return v
+
+    # Pagination
+    COUNT_CACHE_TTL: int = 60  # seconds an estimated total is reused where no planner statistics exist
+
+    # Bulk writes
+    BULK_BATCH_SIZE: int = 1000  # rows per chunk/transaction
+    EXPORT_BATCH_SIZE: int = 1000  # rows fetched and encoded per streamed chunk
+
     # Security
     # SECRET_KEY must be set in .env file or environment variable
     SECRET_KEY: str = "YOUR_SECRET_KEY_HERE_CHANGE_IN_PRODUCTION"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    # Verified tokens kept until they expire, so repeated requests skip signature checks (0 disables)
+    JWT_CACHE_SIZE: int = 10000
+    # Seconds an authenticated user is reused without a query (0 disables), see app/core/user_cache.py
+    AUTH_USER_CACHE_TTL: int = 60
+    PASSWORD_HASH_WORKERS: int = 4  # threads hashing/verifying passwords off the event loop
     WORKERS: int = 1
 
+    # Load shedding, see app/middleware/load_shedding.py; limits are per worker and adapt to latency
+    LOAD_SHEDDING_ENABLED: bool = True
+    CONCURRENCY_LIMIT_INITIAL: int = 50
+    CONCURRENCY_LIMIT_MIN: int = 10
+    CONCURRENCY_LIMIT_MAX: int = 1000
+    LOAD_SHEDDING_RETRY_AFTER: int = 1  # seconds
+    # Shared by the workers for their metrics when WORKERS > 1, emptied on every start
+    PROMETHEUS_MULTIPROC_DIR: str = os.path.join(tempfile.gettempdir(), "prometheus-multiproc")
+
     # CORS
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = []
 
@@ -57,11 +112,44 @@ class Settings(BaseSettings):
 
     # Rate Limit
     REDIS_URL: str = "redis://localhost:6379/0"
+    # Per pool, see app/core/redis.py
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_SOCKET_TIMEOUT: float = 5.0  # seconds
+    REDIS_CONNECT_TIMEOUT: float = 2.0  # seconds
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # seconds an idle connection is trusted before it is PINGed
     RATE_LIMIT_STORAGE_URL: str = "memory://"
+    # With Redis: admit hits leased ahead and refuse recently denied clients without a round trip
+    RATE_LIMIT_LOCAL_PRECHECK: bool = True
+    RATE_LIMIT_LEASE_FRACTION: float = 0.1  # share of the quota left that one process may take ahead
+    RATE_LIMIT_LOCAL_MAX_KEYS: int = 10000
+
+    # Response compression, see app/middleware/compression.py; zstd and br need the zstandard and brotli packages
+    COMPRESSION_MIN_SIZE: int = 1000  # bytes, smaller bodies are sent as they are
+    COMPRESSION_THREAD_MIN_SIZE: int = 128 * 1024  # bytes, larger chunks are compressed off the event loop
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    COMPRESSION_BROTLI_LEVEL: int = 4
 
     # Cache
     CACHE_ENABLED: bool = True
     CACHE_EXPIRATION: int = 60  # seconds
+    # For responses invalidated by tag on every write, see `app.core.cache.invalidate_tags`
+    CACHE_TAGGED_EXPIRATION: int = 6 * 60 * 60  # seconds
+    # How long an expired entry is still served while it is refreshed in the background
+    CACHE_STALE_WHILE_REVALIDATE: int = 5 * 60  # seconds
+    # How long a tag version is kept after it was set; never less than the two above together
+    CACHE_TAG_TTL: int = 24 * 60 * 60  # seconds
+    # Coding of cached response bodies: "zstd", "br" (need the zstandard/brotli packages), "gzip" or "identity"
+    CACHE_COMPRESSION: str = "gzip"
+    CACHE_COMPRESSION_MIN_SIZE: int = 1024  # bytes, smaller bodies are stored as they are
+    # Cross-worker singleflight: how long a worker may hold the recompute lock, and how often the others poll
+    CACHE_LOCK_TIMEOUT: float = 10.0  # seconds
+    CACHE_LOCK_POLL_INTERVAL: float = 0.05  # seconds
+    # In-process tier in front of Redis
+    CACHE_LOCAL_MAX_ENTRIES: int = 1024
+    CACHE_LOCAL_MAX_BYTES: int = 32 * 1024 * 1024
+    CACHE_LOCAL_TTL: float = 5.0  # seconds, bounds staleness if an invalidation message is missed
+    CACHE_INVALIDATION_CHANNEL: str = "fastapi-cache:invalidate"
 
     # Celery
     CELERY_BROKER_URL: str = "redis://localhost:6379/1"
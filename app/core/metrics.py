@@ -0,0 +1,83 @@
+"""
+Prometheus metrics across worker processes.
+
+With more than one worker, `app.cli server` points `PROMETHEUS_MULTIPROC_DIR` at an empty shared
+directory before the workers start. Every worker then writes its metrics to mmap'd files there,
+and `/metrics` aggregates the files of all workers, whichever one answers the scrape. Gauges say
+how they are combined with `multiprocess_mode`. Collectors that read live objects when scraped,
+like the Redis pool metrics, only know about their own process and are left out in this mode.
+"""
+
+import glob
+import os
+from typing import Optional
+
+from prometheus_client import REGISTRY, CollectorRegistry, multiprocess
+
+from app.core.logger import logger
+
+
+def multiprocess_dir() -> Optional[str]:
+    return os.environ.get("PROMETHEUS_MULTIPROC_DIR") or None
+
+
+def prepare_multiprocess_dir(path: str) -> None:
+    """
+    Create or empty `path`, and enable multiprocess mode for the workers started after this call.
+    """
+    os.makedirs(path, exist_ok=True)
+    for filename in glob.glob(os.path.join(path, "*.db")):
+        os.remove(filename)
+    # prometheus_client picks its storage when imported, so the workers must inherit this
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def remove_dead_workers() -> None:
+    """
+    Drop the live gauges of workers that died without shutting down. Their counters and
+    histograms stay, so totals never go backwards.
+    """
+    path = multiprocess_dir()
+    if path is None:
+        return
+    dead = set()
+    for filename in glob.glob(os.path.join(path, "gauge_live*.db")):
+        # gauge_<mode>_<pid>.db
+        pid = int(os.path.basename(filename)[: -len(".db")].rsplit("_", 1)[1])
+        if not _is_alive(pid):
+            dead.add(pid)
+    for pid in dead:
+        multiprocess.mark_process_dead(pid, path)
+    if dead:
+        logger.info(f"Removed the live metrics of dead workers {sorted(dead)}")
+
+
+def mark_worker_dead() -> None:
+    """
+    Drop the live gauges of this worker, on shutdown.
+    """
+    path = multiprocess_dir()
+    if path is not None:
+        multiprocess.mark_process_dead(os.getpid(), path)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """
+    Registry to expose on `/metrics`: the metrics of all workers in multiprocess mode, else this process's.
+    """
+    path = multiprocess_dir()
+    if path is None:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=path)
+    return registry
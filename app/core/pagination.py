@@ -0,0 +1,55 @@
+import base64
+import binascii
+from typing import Any, NamedTuple
+
+import orjson
+
+from app.core.exceptions import ValidationError
+
+NEXT = "next"
+PREV = "prev"
+
+
+class Cursor(NamedTuple):
+    """Decoded keyset position: the sort column, its value and the row id of the boundary row."""
+
+    sort: str
+    value: Any
+    id: int
+    direction: str
+
+
+def _is_scalar(value: Any) -> bool:
+    # bool is an int, but never the value of a sort column
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    """
+    Encode a cursor into an opaque, URL-safe token.
+    """
+    raw = orjson.dumps([cursor.sort, cursor.value, cursor.id, cursor.direction])
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(token: str) -> Cursor:
+    """
+    Decode a token produced by `encode_cursor`, raising ValidationError if it was tampered with.
+
+    The value is only checked to be a scalar here; `CRUDBase` checks it against the sort column.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        sort, value, id_, direction = orjson.loads(raw)
+    except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError) as e:
+        raise ValidationError(detail="Invalid cursor") from e
+
+    if (
+        not isinstance(sort, str)
+        or not _is_scalar(value)
+        or not isinstance(id_, int)
+        or isinstance(id_, bool)
+        or direction not in (NEXT, PREV)
+    ):
+        raise ValidationError(detail="Invalid cursor")
+    return Cursor(sort=sort, value=value, id=id_, direction=direction)
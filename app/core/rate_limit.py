@@ -1,6 +1,270 @@
+"""
+Rate limiting with slowapi, using the sliding window counter strategy.
+
+With Redis, limits hold across workers: every check is one atomic Lua script, so there is no
+read-then-write race. Each process also keeps a small lease of hits taken ahead from Redis, and
+remembers recent denials. Far from the limit most hits are admitted locally, and a client that
+keeps hammering a depleted limit is refused without a round trip. Near the limit every hit asks
+Redis. Leased hits that are not spent in time are given back to the window they were counted in,
+with the process' next check or by a timer when it has none, so they never count against traffic
+that stays under the limit for long.
+"""
+
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from limits.storage import RedisStorage
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
 from app.core.config import settings
+from app.core.logger import logger
+from app.core.redis import create_sync_pool
+
+# Gives back unspent leases: KEYS[first_key..] are (previous, current) window key pairs and
+# ARGV[first_arg..] (hits, expiry, ms until the window they were counted in expires) triples.
+_GIVE_BACK_LEASES = b"""
+local function shift_window(previous_key, current_key, expiry)
+    local current_ttl = tonumber(redis.call('pttl', current_key))
+    if current_ttl > 0 and current_ttl < expiry then
+        -- Current window expired, shift it to the previous window
+        redis.call('rename', current_key, previous_key)
+        redis.call('set', current_key, 0, 'PX', current_ttl + expiry)
+    end
+end
+
+for i = first_key, #KEYS, 2 do
+    local n = (i - first_key) / 2 * 3 + first_arg
+    local hits = tonumber(ARGV[n])
+    local refund_expiry = tonumber(ARGV[n + 1]) * 1000
+    local window_ttl = tonumber(ARGV[n + 2])
+    shift_window(KEYS[i], KEYS[i + 1], refund_expiry)
+    -- Still the current window, or shifted to the previous one since
+    local window_key = KEYS[i]
+    if window_ttl > refund_expiry then
+        window_key = KEYS[i + 1]
+    end
+    local count = tonumber(redis.call('get', window_key)) or 0
+    if count > 0 then
+        redis.call('decrby', window_key, math.min(hits, count))
+    end
+end
+"""
+
+REFUND_LEASES_SCRIPT = b"local first_key, first_arg = 1, 1\n" + _GIVE_BACK_LEASES
+
+# Like limits' acquire_sliding_window.lua, but also hands out up to `lease_fraction` of the quota that
+# is left (at least one hit while any is left), and on a denial returns how long (ms) it will last
+# at least. Before that it gives back unspent leases, from KEYS[3] and ARGV[5] on.
+LEASE_SLIDING_WINDOW_SCRIPT = (
+    b"local first_key, first_arg = 3, 5\n"
+    + _GIVE_BACK_LEASES
+    + b"""
+local limit = tonumber(ARGV[1])
+local expiry = tonumber(ARGV[2]) * 1000
+local amount = tonumber(ARGV[3])
+local lease_fraction = tonumber(ARGV[4])
+
+shift_window(KEYS[1], KEYS[2], expiry)
+
+local previous_count = tonumber(redis.call('get', KEYS[1])) or 0
+local previous_ttl = math.max(tonumber(redis.call('pttl', KEYS[1])), 0)
+local current_count = tonumber(redis.call('get', KEYS[2])) or 0
+local current_ttl = math.max(tonumber(redis.call('pttl', KEYS[2])), 0)
+
+local available = limit - math.floor(previous_count * previous_ttl / expiry) - current_count
+if available < amount then
+    local retry_after = 0
+    if limit - current_count >= amount then
+        -- Once the previous window has decayed enough
+        retry_after = previous_ttl - math.ceil((limit - amount - current_count + 1) * expiry / previous_count)
+    elseif current_ttl > expiry then
+        -- Once the current window is shifted out
+        retry_after = current_ttl - expiry
+    end
+    return {0, math.max(retry_after, 0), 0}
+end
+
+local granted = amount + math.ceil((available - amount) * lease_fraction)
+if redis.call('exists', KEYS[2]) == 1 then
+    redis.call('incrby', KEYS[2], granted)
+else
+    redis.call('set', KEYS[2], granted, 'PX', expiry * 2)
+end
+return {granted, 0, redis.call('pttl', KEYS[2])}
+"""
+)
+
+# Unspent leases of other keys given back with one check at most
+MAX_RETURNED_LEASES = 50
+# Seconds between the timer runs that give back expired leases when no check does
+LEASE_REFUND_INTERVAL = 1.0
+
+
+class _Lease(NamedTuple):
+    # Hits this process may still admit on its own; 0 means Redis denied the last one
+    hits: int
+    until: float  # time.monotonic()
+    expiry: int = 0
+    # When the window the hits were counted in expires, for giving back the unspent ones
+    window_until: float = 0.0
+
+
+class LeasedRedisStorage(RedisStorage):
+    """
+    Redis storage that checks sliding windows in one script and keeps the per-process leases and
+    denials described in the module docstring. Selected with a `leased+redis://` or
+    `leased+rediss://` uri.
+    """
+
+    STORAGE_SCHEME = ["leased+redis", "leased+rediss"]
+
+    def __init__(self, uri: str, **options: Any) -> None:
+        super().__init__(uri.removeprefix("leased+"), **options)
+        self._leases: "OrderedDict[str, _Lease]" = OrderedDict()
+        # (until, key) of the leases with hits, soonest first; entries of spent leases linger
+        self._lease_expiries: List[Tuple[float, str]] = []
+        self._unspent: List[Tuple[str, _Lease]] = []
+        self._refund_timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def initialize_storage(self, uri: str) -> None:
+        super().initialize_storage(uri)
+        self.lua_lease_sliding_window = self.get_connection().register_script(LEASE_SLIDING_WINDOW_SCRIPT)
+        self.lua_refund_leases = self.get_connection().register_script(REFUND_LEASES_SCRIPT)
+
+    def _remember(self, key: str, lease: _Lease) -> None:
+        self._leases[key] = lease
+        self._leases.move_to_end(key)
+        if lease.hits:
+            heapq.heappush(self._lease_expiries, (lease.until, key))
+            self._schedule_refund(lease.until)
+        while len(self._leases) > settings.RATE_LIMIT_LOCAL_MAX_KEYS:
+            evicted_key, evicted = self._leases.popitem(last=False)
+            if evicted.hits:
+                self._unspent.append((evicted_key, evicted))
+
+    def _schedule_refund(self, until: float) -> None:
+        """
+        Make sure expired leases are given back even if this process checks no other key for a while
+        (called with the lock held). At most one timer is pending, and it runs LEASE_REFUND_INTERVAL apart at least.
+        """
+        if self._refund_timer is not None:
+            return
+        delay = max(until - time.monotonic(), LEASE_REFUND_INTERVAL)
+        self._refund_timer = threading.Timer(delay, self.refund_expired_leases)
+        self._refund_timer.daemon = True
+        self._refund_timer.start()
+
+    def refund_expired_leases(self) -> None:
+        """
+        Give back the unspent hits of expired leases, like the next check would.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._refund_timer = None
+            unspent = self._take_unspent(None, now)
+            if self._lease_expiries:
+                self._schedule_refund(self._lease_expiries[0][0])
+        keys, args = self._refund_args(unspent, now)
+        if not keys:
+            return
+        try:
+            self.lua_refund_leases(keys, args)
+        except Exception as e:
+            # The hits stay counted until their window expires
+            logger.warning(f"Failed to give back {len(unspent)} unspent rate limit leases: {e}")
+
+    def _take_unspent(self, key: Optional[str], now: float) -> List[Tuple[str, _Lease]]:
+        unspent, self._unspent = self._unspent, []
+        if key is not None:
+            lease = self._leases.pop(key, None)
+            if lease is not None and lease.hits:
+                unspent.append((key, lease))
+        while self._lease_expiries and self._lease_expiries[0][0] <= now and len(unspent) < MAX_RETURNED_LEASES:
+            until, expired_key = heapq.heappop(self._lease_expiries)
+            lease = self._leases.get(expired_key)
+            if lease is not None and lease.hits and lease.until == until:
+                del self._leases[expired_key]
+                unspent.append((expired_key, lease))
+        return unspent
+
+    def _window_keys(self, key: str) -> List[str]:
+        return [self.prefixed_key(self._previous_window_key(key)), self.prefixed_key(self._current_window_key(key))]
+
+    def _refund_args(self, unspent: List[Tuple[str, _Lease]], now: float) -> Tuple[List[str], List[Any]]:
+        keys: List[str] = []
+        args: List[Any] = []
+        for unspent_key, lease in unspent:
+            window_ttl = int((lease.window_until - now) * 1000)
+            if window_ttl > 0:
+                keys += self._window_keys(unspent_key)
+                args += [lease.hits, lease.expiry, window_ttl]
+        return keys, args
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is not None and lease.until > now:
+                if lease.hits == 0:
+                    return False
+                if lease.hits >= amount:
+                    if lease.hits > amount:
+                        self._leases[key] = lease._replace(hits=lease.hits - amount)
+                    else:
+                        del self._leases[key]
+                    return True
+            unspent = self._take_unspent(key, now)
+
+        refund_keys, refund_args = self._refund_args(unspent, now)
+        granted, retry_after, window_ttl = self.lua_lease_sliding_window(
+            self._window_keys(key) + refund_keys,
+            [limit, expiry, amount, settings.RATE_LIMIT_LEASE_FRACTION, *refund_args],
+        )
+        with self._lock:
+            if granted:
+                if granted > amount:
+                    # Spend the rest within the time the window takes to free one hit
+                    self._remember(
+                        key,
+                        _Lease(int(granted) - amount, now + expiry / limit, expiry, now + int(window_ttl) / 1000),
+                    )
+                return True
+            if retry_after:
+                self._remember(key, _Lease(0, now + int(retry_after) / 1000))
+            return False
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        with self._lock:
+            self._leases.pop(key, None)
+        super().clear_sliding_window(key, expiry)
+
+    def reset(self) -> Any:
+        with self._lock:
+            self._leases.clear()
+            self._lease_expiries.clear()
+            self._unspent.clear()
+            if self._refund_timer is not None:
+                self._refund_timer.cancel()
+                self._refund_timer = None
+        return super().reset()
+
+
+storage_uri = settings.RATE_LIMIT_STORAGE_URL
+storage_options: Dict[str, Any] = {}
+if storage_uri.startswith(("redis://", "rediss://")):
+    # `limits` is synchronous, so it cannot share the async pool; bound its own instead
+    storage_options["connection_pool"] = create_sync_pool(storage_uri, "rate_limit")
+    if settings.RATE_LIMIT_LOCAL_PRECHECK:
+        storage_uri = f"leased+{storage_uri}"
 
-limiter = Limiter(key_func=get_remote_address, storage_uri=settings.RATE_LIMIT_STORAGE_URL)
+limiter = Limiter(
+    key_func=get_remote_address,
+    strategy="sliding-window-counter",
+    storage_uri=storage_uri,
+    storage_options=storage_options,
+)
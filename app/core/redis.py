@@ -0,0 +1,80 @@
+"""
+Shared Redis connection pools.
+
+The application opens one pooled async client in `lifespan` (kept on `app.state.redis`) for
+the response cache and health checks. The rate limiter talks to Redis synchronously through
+`limits`, so it gets a sync pool with the same limits. Both are reported on `/metrics`.
+"""
+
+from typing import Any, Dict, Iterator
+
+import redis
+from prometheus_client.core import REGISTRY, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from redis import asyncio as aioredis
+
+from app.core.config import settings
+
+
+def pool_options() -> Dict[str, Any]:
+    return {
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": settings.REDIS_CONNECT_TIMEOUT,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL,
+    }
+
+
+class PoolCollector(Collector):
+    """
+    Reports the connections of the registered pools, read when `/metrics` is scraped.
+    """
+
+    def __init__(self) -> None:
+        self._pools: Dict[str, Any] = {}
+
+    def register(self, name: str, pool: Any) -> None:
+        self._pools[name] = pool
+
+    def unregister(self, name: str) -> None:
+        self._pools.pop(name, None)
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        connections = GaugeMetricFamily(
+            "redis_pool_connections", "Connections held by a Redis connection pool", labels=["pool", "state"]
+        )
+        limit = GaugeMetricFamily(
+            "redis_pool_max_connections", "Size limit of a Redis connection pool", labels=["pool"]
+        )
+        for name, pool in self._pools.items():
+            connections.add_metric([name, "in_use"], len(getattr(pool, "_in_use_connections", ())))
+            connections.add_metric([name, "idle"], len(getattr(pool, "_available_connections", ())))
+            limit.add_metric([name], pool.max_connections)
+        yield connections
+        yield limit
+
+
+pool_collector = PoolCollector()
+REGISTRY.register(pool_collector)
+
+
+def create_redis() -> Any:
+    """
+    Async client on a new pool for `REDIS_URL`; connections are opened lazily.
+
+    Replies are raw bytes: the cache stores compressed bodies, which are not valid UTF-8.
+    """
+    pool: aioredis.ConnectionPool = aioredis.ConnectionPool.from_url(settings.REDIS_URL, **pool_options())
+    pool_collector.register("app", pool)
+    return aioredis.Redis(connection_pool=pool)
+
+
+async def close_redis(client: Any) -> None:
+    pool_collector.unregister("app")
+    await client.connection_pool.disconnect()
+
+
+def create_sync_pool(url: str, name: str) -> redis.ConnectionPool:
+    pool = redis.ConnectionPool.from_url(url, **pool_options())
+    pool_collector.register(name, pool)
+    return pool
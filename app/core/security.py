@@ -1,10 +1,26 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any, Optional, Union
+from typing import Any, Callable, NamedTuple, Optional, TypeVar, Union
 
 import bcrypt
 import jwt
+from prometheus_client import Gauge
 
 from app.core.config import settings
+from app.schemas.token import TokenPayload
+
+T = TypeVar("T")
+
+# bcrypt releases the GIL while hashing, so a few threads hash in parallel without blocking the event loop
+_hash_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+PASSWORD_HASH_JOBS = Gauge(
+    "password_hash_jobs", "Password hashing jobs on the executor", ["state"], multiprocess_mode="livesum"
+)
 
 
 def create_access_token(subject: Union[str, Any], expires_delta: Optional[timedelta] = None) -> str:
@@ -29,9 +45,88 @@ def create_refresh_token(subject: Union[str, Any], expires_delta: Optional[timed
     return str(encoded_jwt)
 
 
+class _VerifiedToken(NamedTuple):
+    expires_at: float
+    # What the token was verified with; a reload that changes either makes the entry useless
+    secret_key: str
+    algorithm: str
+    payload: TokenPayload
+
+
+_verified_tokens: "OrderedDict[bytes, _VerifiedToken]" = OrderedDict()
+
+
+def decode_token(token: str) -> TokenPayload:
+    """
+    Verify `token` and parse its claims.
+
+    Verified tokens are kept in a bounded LRU (`JWT_CACHE_SIZE`) until they expire, so a client
+    repeating its token skips the signature check and the parsing. Raises `jwt.PyJWTError` or
+    `pydantic.ValidationError` for an invalid token, like `jwt.decode` and `TokenPayload` do.
+    """
+    if settings.JWT_CACHE_SIZE <= 0:
+        return TokenPayload(**jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]))
+
+    digest = hashlib.sha256(token.encode("utf-8")).digest()
+    entry = _verified_tokens.get(digest)
+    if entry is not None:
+        if (
+            entry.expires_at > time.time()
+            and entry.secret_key == settings.SECRET_KEY
+            and entry.algorithm == settings.ALGORITHM
+        ):
+            _verified_tokens.move_to_end(digest)
+            return entry.payload
+        # Expired or verified with an old key: verify again, which raises if it is no longer valid
+        _verified_tokens.pop(digest, None)
+
+    claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    payload = TokenPayload(**claims)
+    expires_at = claims.get("exp")
+    if isinstance(expires_at, (int, float)):
+        _verified_tokens[digest] = _VerifiedToken(float(expires_at), settings.SECRET_KEY, settings.ALGORITHM, payload)
+        while len(_verified_tokens) > settings.JWT_CACHE_SIZE:
+            _verified_tokens.popitem(last=False)
+    return payload
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
 
 
 def get_password_hash(password: str) -> str:
     return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+
+async def _run_hashing(fn: Callable[..., T], *args: Any) -> T:
+    """
+    Run `fn` on the password hashing executor, tracking queued and running jobs.
+    """
+    queued = PASSWORD_HASH_JOBS.labels(state="queued")
+    running = PASSWORD_HASH_JOBS.labels(state="running")
+
+    def job() -> T:
+        queued.dec()
+        running.inc()
+        try:
+            return fn(*args)
+        finally:
+            running.dec()
+
+    def on_done(future: "Future[T]") -> None:
+        # Cancelled while still queued: `job` never ran
+        if future.cancelled():
+            queued.dec()
+
+    queued.inc()
+    future = _hash_executor.submit(job)
+    future.add_done_callback(on_done)
+    return await asyncio.wrap_future(future)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hashing(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hashing(get_password_hash, password)
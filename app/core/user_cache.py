@@ -0,0 +1,68 @@
+"""
+Cache of authenticated users for `get_current_user`, so authenticating a request does not
+cost a database query.
+
+Snapshots (without the password hash) go through the response cache backend: the local tier
+of every worker, shared through Redis when there is one. `CRUDUser` writes drop them; changes
+made any other way apply after at most `AUTH_USER_CACHE_TTL` seconds.
+"""
+
+from typing import Any, Dict, Optional
+
+import orjson
+from fastapi_cache import FastAPICache
+
+from app.core.config import settings
+from app.core.logger import logger
+
+SNAPSHOT_FIELDS = ("id", "email", "full_name", "is_active", "is_superuser")
+
+
+def _namespace() -> str:
+    return f"{FastAPICache.get_prefix()}:auth-user"
+
+
+def _enabled() -> bool:
+    return FastAPICache._init and FastAPICache.get_enable() and settings.AUTH_USER_CACHE_TTL > 0
+
+
+async def get_user_snapshot(user_id: int) -> Optional[Dict[str, Any]]:
+    if not _enabled():
+        return None
+    try:
+        data = await FastAPICache.get_backend().get(f"{_namespace()}:{user_id}")
+    except Exception as e:
+        logger.warning(f"Failed to read cached user {user_id}: {e}")
+        return None
+    return orjson.loads(data) if data is not None else None
+
+
+async def set_user_snapshot(user: Any) -> None:
+    if not _enabled():
+        return
+    snapshot = {field: getattr(user, field) for field in SNAPSHOT_FIELDS}
+    try:
+        await FastAPICache.get_backend().set(
+            f"{_namespace()}:{user.id}", orjson.dumps(snapshot), settings.AUTH_USER_CACHE_TTL
+        )
+    except Exception as e:
+        logger.warning(f"Failed to cache user {user.id}: {e}")
+
+
+async def invalidate_user_snapshots(*user_ids: Any) -> None:
+    """
+    Drop the cached snapshots of `user_ids`.
+    """
+    if not _enabled() or not user_ids:
+        return
+    backend = FastAPICache.get_backend()
+    keys = [f"{_namespace()}:{user_id}" for user_id in user_ids]
+    try:
+        delete = getattr(backend, "delete", None)
+        if delete is not None:
+            await delete(*keys)
+            return
+        for key in keys:
+            await backend.clear(key=key)
+    except Exception as e:
+        logger.error(f"Failed to invalidate cached users {user_ids}: {e}")
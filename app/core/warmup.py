@@ -0,0 +1,75 @@
+"""
+Warm-up run by `lifespan` before a worker reports ready (see `/readyz`).
+
+Pre-opens the database pools and requests the hot routes in `WARMUP_ROUTES` in-process,
+so the first real requests find open connections, imported code paths and a filled cache.
+"""
+
+import asyncio
+from typing import Any, List
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.session import engine, replicas
+
+
+async def warm_db_pool(db_engine: AsyncEngine, size: int) -> int:
+    """
+    Open `size` connections at once and return them to the pool; returns how many succeeded.
+    """
+
+    async def open_connection() -> AsyncConnection:
+        conn = await db_engine.connect()
+        await conn.execute(text("SELECT 1"))
+        return conn
+
+    results: List[Any] = await asyncio.gather(*(open_connection() for _ in range(size)), return_exceptions=True)
+    opened = [conn for conn in results if isinstance(conn, AsyncConnection)]
+    for conn in opened:
+        await conn.close()
+    for error in results:
+        if isinstance(error, BaseException):
+            logger.warning(f"Failed to pre-open database connection: {error}")
+            break
+    return len(opened)
+
+
+async def warm_routes(app: FastAPI, routes: List[str]) -> None:
+    """
+    GET every route through the whole application, which fills the cache for cached endpoints.
+    """
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://warmup") as client:
+        for route in routes:
+            try:
+                response = await client.get(route)
+                logger.info(f"Warmed up {route}: {response.status_code}")
+            except Exception as e:
+                logger.warning(f"Failed to warm up {route}: {e}")
+
+
+async def warm_up(app: FastAPI) -> None:
+    """
+    Warm the worker up, then mark it ready. Failures are logged and never keep it from becoming ready.
+    """
+    try:
+        await asyncio.wait_for(_warm_up(app), timeout=settings.WARMUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Warm-up did not finish within {settings.WARMUP_TIMEOUT}s")
+    except Exception as e:
+        logger.warning(f"Warm-up failed: {e}")
+    finally:
+        app.state.ready = True
+        logger.info("Warm-up finished, ready to serve")
+
+
+async def _warm_up(app: FastAPI) -> None:
+    engines = [engine, *(replica.engine for replica in replicas.replicas)]
+    opened = await asyncio.gather(*(warm_db_pool(db_engine, settings.DB_POOL_SIZE) for db_engine in engines))
+    logger.info(f"Pre-opened database connections: {opened}")
+    await warm_routes(app, settings.WARMUP_ROUTES)
@@ -1,59 +1,446 @@
-from typing import Any, Generic, Optional, Sequence, Type, TypeVar
+import asyncio
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Generic,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
 from pydantic import BaseModel
-from sqlalchemy import func
+from sqlalchemy import delete, func, insert, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import load_only
+
+from app.core.cache import invalidate_tags
+from app.core.config import settings
+from app.core.exceptions import ValidationError
+from app.core.pagination import NEXT, PREV, Cursor, decode_cursor, encode_cursor
+from app.crud.loader import BatchLoader
 
 ModelType = TypeVar("ModelType", bound=Any)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
+# Postgres caps a single statement at 32767 bind parameters
+MAX_BIND_PARAMS = 32767
+
+# (monotonic timestamp, row count) per database URL and table, see `CRUDBase.estimate_count`
+_count_cache: Dict[str, Tuple[float, int]] = {}
+
+
+class PageResult(NamedTuple):
+    items: Sequence[Any]
+    total: int
+    total_estimated: bool
+    next: Optional[str]
+    prev: Optional[str]
+
+
+def _chunks(rows: List[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    for start in range(0, len(rows), size):
+        yield rows[start : start + size]
+
 
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    # Indexed, non-nullable columns that can drive keyset pagination (`id` is always the tie-breaker)
+    sortable_columns: Tuple[str, ...] = ("id",)
+
     def __init__(self, model: Type[ModelType]):
         self.model = model
+        self._loader = BatchLoader(model)
+
+    @property
+    def cache_tag(self) -> str:
+        """
+        Cache tag of every response built from this model's rows, see `app.core.cache`.
+        """
+        return str(self.model.__tablename__)
+
+    def row_cache_tag(self, id: Any) -> str:
+        """
+        Cache tag of the responses built from the row `id`.
+        """
+        return f"{self.cache_tag}:{id}"
+
+    async def _invalidate_cache(self, *ids: Any) -> None:
+        """
+        Invalidate cached responses tagged with this model, or with one of the written rows.
+        """
+        await invalidate_tags(self.cache_tag, *(self.row_cache_tag(id) for id in ids))
+
+    def _sort_column(self, sort: str) -> Any:
+        if sort not in self.sortable_columns:
+            raise ValidationError(detail=f"Cannot sort by '{sort}'")
+        return getattr(self.model, sort)
+
+    def _order_by(self, sort: str, *, descending: bool = False) -> List[Any]:
+        columns = [self._sort_column(sort)]
+        if sort != "id":
+            columns.append(self.model.id)
+        return [c.desc() for c in columns] if descending else columns
+
+    def _seek(self, position: Cursor) -> Any:
+        column = self._sort_column(position.sort)
+        python_type = column.type.python_type
+        if not isinstance(position.value, (int, float) if python_type is float else python_type):
+            raise ValidationError(detail="Invalid cursor")
+        if position.sort == "id":
+            return column > position.id if position.direction == NEXT else column < position.id
+        key = tuple_(column, self.model.id)
+        boundary = tuple_(position.value, position.id)
+        return key > boundary if position.direction == NEXT else key < boundary
 
-    async def get(self, db: AsyncSession, id: int) -> Optional[ModelType]:
-        result = await db.execute(select(self.model).filter(self.model.id == id))
+    def make_cursor(self, obj: ModelType, *, sort: str = "id", direction: str = NEXT) -> str:
+        return encode_cursor(Cursor(sort=sort, value=getattr(obj, sort), id=obj.id, direction=direction))
+
+    def page_cursors(
+        self, rows: Sequence[ModelType], *, sort: str = "id", has_prev: bool, has_next: bool
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Build the (next, prev) cursors around a page of rows.
+        """
+        if not rows:
+            return None, None
+        next_cursor = self.make_cursor(rows[-1], sort=sort, direction=NEXT) if has_next else None
+        prev_cursor = self.make_cursor(rows[0], sort=sort, direction=PREV) if has_prev else None
+        return next_cursor, prev_cursor
+
+    def _load_only(self, stmt: Any, fields: Optional[Sequence[str]], *required: str) -> Any:
+        """
+        Restrict the SELECT to `fields` (plus `required` and the primary key) when a fieldset is given.
+        """
+        if fields is None:
+            return stmt
+        names = dict.fromkeys([*fields, *required])
+        return stmt.options(load_only(*(getattr(self.model, name) for name in names)))
+
+    async def get(self, db: AsyncSession, id: int, *, fields: Optional[Sequence[str]] = None) -> Optional[ModelType]:
+        if fields is None:
+            # Concurrent lookups from the same event-loop tick share one `WHERE id IN (...)` query
+            return await self._loader.load(db, id)
+        stmt = self._load_only(select(self.model).filter(self.model.id == id), fields)
+        result = await db.execute(stmt)
         scalar_result = result.scalars().first()
         if scalar_result is None:
             return None
         return scalar_result  # type: ignore
 
-    async def get_multi(self, db: AsyncSession, *, skip: int = 0, limit: int = 100) -> Sequence[ModelType]:
-        result = await db.execute(select(self.model).offset(skip).limit(limit))
+    async def get_many(
+        self, db: AsyncSession, *, ids: Sequence[int], fields: Optional[Sequence[str]] = None
+    ) -> List[ModelType]:
+        """
+        Fetch several rows by primary key in one query, in the order of `ids` (missing ones are skipped).
+        """
+        stmt = self._load_only(select(self.model).where(self.model.id.in_(ids)), fields)
+        result = await db.execute(stmt)
+        found = {obj.id: obj for obj in result.scalars().all()}
+        return [found[id] for id in ids if id in found]
+
+    async def get_multi(
+        self, db: AsyncSession, *, skip: int = 0, limit: int = 100, sort: str = "id"
+    ) -> Sequence[ModelType]:
+        result = await db.execute(select(self.model).order_by(*self._order_by(sort)).offset(skip).limit(limit))
         return result.scalars().all()  # type: ignore
 
+    async def get_page(
+        self,
+        db: AsyncSession,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        sort: str = "id",
+        estimate_total: bool = False,
+        fields: Optional[Sequence[str]] = None,
+    ) -> PageResult:
+        """
+        Fetch a page of rows together with the total in a single statement.
+
+        With a `cursor` the page is found by seeking past the boundary row (keyset pagination)
+        instead of scanning and discarding `skip` rows. The exact total rides along as a
+        `count(*) OVER ()` window (offset pages) or a scalar subquery (keyset pages);
+        `estimate_total` skips it in favour of `estimate_count`. `fields` narrows the SELECT.
+        """
+        position = decode_cursor(cursor) if cursor else None
+        if position is not None:
+            sort = position.sort
+        backwards = position is not None and position.direction == PREV
+
+        # Fetch one extra row to find out whether there is another page in this direction
+        stmt = select(self.model).order_by(*self._order_by(sort, descending=backwards)).limit(limit + 1)
+        # The sort column is needed to build the cursors
+        stmt = self._load_only(stmt, fields, sort)
+        if position is not None:
+            stmt = stmt.where(self._seek(position))
+        else:
+            stmt = stmt.offset(skip)
+
+        total_estimated = False
+        if estimate_total:
+            result = await db.execute(stmt)
+            rows: List[ModelType] = list(result.scalars().all())
+            total, total_estimated = await self.estimate_count(db)
+        else:
+            total_column: Any
+            if position is None:
+                total_column = func.count().over()
+            else:
+                # A window would only count the rows past the cursor
+                total_column = select(func.count()).select_from(self.model).scalar_subquery()
+            result = await db.execute(stmt.add_columns(total_column.label("total")))
+            fetched = result.all()
+            rows = [row[0] for row in fetched]
+            if fetched:
+                total = int(fetched[0][1])
+            elif position is not None or skip > 0:
+                # Past the end: no row left to carry the window value
+                total = await self.count(db)
+            else:
+                total = 0
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backwards:
+            rows.reverse()
+
+        if position is None:
+            has_prev, has_next = skip > 0, has_more
+        elif backwards:
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = True, has_more
+        next_cursor, prev_cursor = self.page_cursors(rows, sort=sort, has_prev=has_prev, has_next=has_next)
+        return PageResult(items=rows, total=total, total_estimated=total_estimated, next=next_cursor, prev=prev_cursor)
+
+    async def stream(self, db: AsyncSession, *, batch_size: Optional[int] = None) -> AsyncIterator[Sequence[ModelType]]:
+        """
+        Yield every row in primary key order, `batch_size` rows at a time, from a server-side cursor.
+        """
+        size = batch_size or settings.EXPORT_BATCH_SIZE
+        stmt = select(self.model).order_by(self.model.id).execution_options(yield_per=size)
+        result = await db.stream(stmt)
+        async for partition in result.scalars().partitions(size):
+            yield partition
+
     async def count(self, db: AsyncSession) -> int:
         result = await db.execute(select(func.count()).select_from(self.model))
         val = result.scalar()
         return int(val) if val is not None else 0
 
-    async def create(self, db: AsyncSession, *, obj_in: CreateSchemaType) -> ModelType:
-        obj_in_data = obj_in.model_dump()
-        db_obj = self.model(**obj_in_data)
-        db.add(db_obj)
-        await db.commit()
-        await db.refresh(db_obj)
+    async def estimate_count(self, db: AsyncSession) -> Tuple[int, bool]:
+        """
+        Approximate row count without a table scan: planner statistics on Postgres,
+        a count cached for `COUNT_CACHE_TTL` seconds everywhere else.
+
+        Returns the count and whether it is approximate: without statistics, or with the cached
+        count missing or expired, it is an exact count instead.
+        """
+        bind = db.get_bind()
+        table = self.model.__table__.name
+        if bind.dialect.name == "postgresql":
+            result = await db.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+                {"table": bind.dialect.identifier_preparer.quote(table)},
+            )
+            estimate = result.scalar()
+            # reltuples is -1 (or 0) until the table has been vacuumed/analyzed
+            if estimate is not None and estimate > 0:
+                return int(estimate), True
+            return await self.count(db), False
+
+        key = f"{bind.engine.url}:{table}"
+        cached = _count_cache.get(key)
+        now = time.monotonic()
+        if cached is not None and now - cached[0] < settings.COUNT_CACHE_TTL:
+            return cached[1], True
+        total = await self.count(db)
+        _count_cache[key] = (now, total)
+        return total, False
+
+    async def _prepare_row(self, obj_in: Union[CreateSchemaType, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Turn an input schema into a column -> value mapping for the bulk paths.
+        """
+        if isinstance(obj_in, dict):
+            return obj_in
+        return obj_in.model_dump()
+
+    async def _prepare_rows(self, objs_in: Sequence[Union[CreateSchemaType, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        return list(await asyncio.gather(*(self._prepare_row(obj_in) for obj_in in objs_in)))
+
+    def _batch_size(self, batch_size: Optional[int], columns: int) -> int:
+        size = batch_size or settings.BULK_BATCH_SIZE
+        return max(1, min(size, MAX_BIND_PARAMS // max(columns, 1)))
+
+    async def create_many(
+        self,
+        db: AsyncSession,
+        *,
+        objs_in: Sequence[Union[CreateSchemaType, Dict[str, Any]]],
+        batch_size: Optional[int] = None,
+    ) -> int:
+        """
+        Bulk insert rows in chunks of `batch_size` (default `BULK_BATCH_SIZE`), one transaction per chunk.
+
+        Uses the binary COPY protocol on asyncpg, a multi-row INSERT on other Postgres
+        drivers and `executemany` on SQLite. Returns the number of inserted rows.
+        """
+        rows = await self._prepare_rows(objs_in)
+        if not rows:
+            return 0
+        table = self.model.__table__
+        dialect = db.get_bind().dialect
+        ids: List[Any] = []
+        for chunk in _chunks(rows, self._batch_size(batch_size, len(rows[0]))):
+            if dialect.driver == "asyncpg":
+                columns = list(chunk[0])
+                conn = await db.connection()
+                raw_conn = await conn.get_raw_connection()
+                asyncpg_conn: Any = raw_conn.driver_connection
+                # A single COPY is atomic on its own. It reports no ids, but new rows have no
+                # cached representation to invalidate
+                await asyncpg_conn.copy_records_to_table(
+                    table.name, records=[tuple(row[c] for c in columns) for row in chunk], columns=columns
+                )
+            elif dialect.name == "postgresql":
+                result = await db.execute(insert(table).values(chunk).returning(table.c.id))
+                ids.extend(result.scalars())
+            elif dialect.insert_executemany_returning:
+                result = await db.execute(insert(table).returning(table.c.id), chunk)
+                ids.extend(result.scalars())
+            else:
+                await db.execute(insert(table), chunk)
+            await db.commit()
+        await self._invalidate_cache(*ids)
+        return len(rows)
+
+    async def upsert_many(
+        self,
+        db: AsyncSession,
+        *,
+        objs_in: Sequence[Union[CreateSchemaType, Dict[str, Any]]],
+        index_elements: Sequence[str],
+        batch_size: Optional[int] = None,
+    ) -> int:
+        """
+        Bulk INSERT ... ON CONFLICT (`index_elements`) DO UPDATE, one transaction per chunk.
+
+        Sent as a multi-row statement on Postgres and through `executemany` on SQLite.
+        Later rows win when the input repeats a key. Returns the number of rows written.
+        """
+        # Postgres refuses to update the same row twice within one statement
+        by_key = {tuple(row[k] for k in index_elements): row for row in await self._prepare_rows(objs_in)}
+        rows = list(by_key.values())
+        if not rows:
+            return 0
+        table = self.model.__table__
+        dialect = db.get_bind().dialect
+        is_postgres = dialect.name == "postgresql"
+        ids: List[Any] = []
+        for chunk in _chunks(rows, self._batch_size(batch_size, len(rows[0]))):
+            stmt: Any = pg_insert(table).values(chunk) if is_postgres else sqlite_insert(table)
+            update_columns = {c: stmt.excluded[c] for c in chunk[0] if c not in index_elements}
+            if update_columns:
+                stmt = stmt.on_conflict_do_update(index_elements=list(index_elements), set_=update_columns)
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=list(index_elements))
+            # The ids of the updated rows, whose cached representations are now stale
+            if is_postgres:
+                result = await db.execute(stmt.returning(table.c.id))
+                ids.extend(result.scalars())
+            elif dialect.insert_executemany_returning:
+                result = await db.execute(stmt.returning(table.c.id), chunk)
+                ids.extend(result.scalars())
+            else:
+                await db.execute(stmt, chunk)
+                ids.extend(await self._ids_by(db, index_elements, chunk))
+            await db.commit()
+        await self._invalidate_cache(*ids)
+        return len(rows)
+
+    async def _ids_by(self, db: AsyncSession, index_elements: Sequence[str], rows: List[Dict[str, Any]]) -> List[Any]:
+        """
+        Ids of the rows matching `rows` on `index_elements`, for drivers without RETURNING.
+        """
+        key = tuple_(*(getattr(self.model, k) for k in index_elements))
+        values = [tuple(row[k] for k in index_elements) for row in rows]
+        result = await db.execute(select(self.model.id).where(key.in_(values)))
+        return list(result.scalars())
+
+    async def _insert(self, db: AsyncSession, values: Dict[str, Any]) -> ModelType:
+        """
+        INSERT ... RETURNING in one round trip where the dialect supports it, add + refresh otherwise.
+        """
+        if db.get_bind().dialect.insert_returning:
+            result = await db.execute(insert(self.model).values(**values).returning(self.model))
+            db_obj = result.scalars().one()
+            await db.commit()
+        else:
+            db_obj = self.model(**values)
+            db.add(db_obj)
+            await db.commit()
+            await db.refresh(db_obj)
+        await self._invalidate_cache(db_obj.id)
         return db_obj  # type: ignore
 
+    async def create(self, db: AsyncSession, *, obj_in: CreateSchemaType) -> ModelType:
+        return await self._insert(db, obj_in.model_dump())
+
     async def update(self, db: AsyncSession, *, db_obj: ModelType, obj_in: UpdateSchemaType) -> ModelType:
         if isinstance(obj_in, dict):
             update_data = obj_in
         else:
             update_data = obj_in.model_dump(exclude_unset=True)
-        for field in update_data:
-            setattr(db_obj, field, update_data[field])
-        db.add(db_obj)
-        await db.commit()
-        await db.refresh(db_obj)
+        columns = self.model.__table__.columns
+        update_data = {field: value for field, value in update_data.items() if field in columns}
+        if not update_data:
+            return db_obj
+        if db.get_bind().dialect.update_returning:
+            stmt = (
+                update(self.model)
+                .where(self.model.id == db_obj.id)
+                .values(**update_data)
+                .returning(self.model)
+                # Overwrite the already loaded `db_obj` with the returned row
+                .execution_options(populate_existing=True, synchronize_session=False)
+            )
+            result = await db.execute(stmt)
+            db_obj = result.scalars().one()
+            await db.commit()
+        else:
+            for field in update_data:
+                setattr(db_obj, field, update_data[field])
+            db.add(db_obj)
+            await db.commit()
+            await db.refresh(db_obj)
+        await self._invalidate_cache(db_obj.id)
         return db_obj
 
     async def remove(self, db: AsyncSession, *, id: int) -> ModelType:
-        obj = await self.get(db, id)
-        if obj:
+        if db.get_bind().dialect.delete_returning:
+            result = await db.execute(delete(self.model).where(self.model.id == id).returning(self.model))
+            obj = result.scalars().first()
+            if obj is None:
+                raise ValueError("Object not found")
+            await db.commit()
+        else:
+            obj = await self.get(db, id)
+            if not obj:
+                raise ValueError("Object not found")
             await db.delete(obj)
             await db.commit()
-            return obj
-        raise ValueError("Object not found")
+        await self._invalidate_cache(id)
+        return obj  # type: ignore
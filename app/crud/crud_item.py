@@ -1,10 +1,93 @@
-from app.crud.base import CRUDBase
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import ColumnClause, Select, Subquery, and_, func, literal_column, or_, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.exceptions import AppError, ValidationError
+from app.core.pagination import NEXT, Cursor, decode_cursor, encode_cursor
+from app.crud.base import CRUDBase, PageResult
 from app.models.item import Item
 from app.schemas.item import ItemCreate, ItemUpdate
 
+items_fts = table("items_fts")
+
+
+def _fts5_query(q: str) -> str:
+    # Quote every term so user input cannot inject FTS5 query syntax; terms are ANDed. This also
+    # turns `app*` into a literal term, so prefix queries are not supported
+    return " ".join('"' + term.replace('"', '""') + '"' for term in q.split())
+
 
 class CRUDItem(CRUDBase[Item, ItemCreate, ItemUpdate]):
-    pass
+    def _ranked_matches(self, db: AsyncSession, q: str) -> Subquery:
+        """
+        Subquery of (id, rank, total) for the items matching `q`; lower rank is more relevant.
+        """
+        dialect = db.get_bind().dialect.name
+        stmt: Select[Any, Any, Any]
+        if dialect == "sqlite":
+            fts: ColumnClause[Any] = literal_column("items_fts")
+            stmt = (
+                select(
+                    literal_column("items_fts.rowid").label("id"),
+                    # Hidden FTS5 column: bm25() with the weights configured on the table
+                    literal_column("items_fts.rank").label("rank"),
+                    func.count().over().label("total"),
+                )
+                .select_from(items_fts)
+                .where(fts.op("MATCH")(_fts5_query(q)))
+            )
+        elif dialect == "postgresql":
+            vector: ColumnClause[Any] = literal_column("items.search_vector")
+            ts_query = func.websearch_to_tsquery("english", q)
+            stmt = (
+                select(
+                    Item.id.label("id"),
+                    (-func.ts_rank_cd(vector, ts_query)).label("rank"),
+                    func.count().over().label("total"),
+                )
+                .select_from(Item.__table__)
+                .where(vector.op("@@")(ts_query))
+            )
+        else:
+            raise AppError(detail=f"Full-text search is not supported on {dialect}")
+        return stmt.subquery("ranked")
+
+    async def search(self, db: AsyncSession, *, q: str, limit: int = 20, cursor: Optional[str] = None) -> PageResult:
+        """
+        Relevance-ranked full-text search over title and description, paged with a (rank, id) cursor.
+        """
+        if not q.strip():
+            raise ValidationError(detail="Search query must not be empty")
+        position = decode_cursor(cursor) if cursor else None
+        if position is not None and (
+            position.sort != "rank" or position.direction != NEXT or not isinstance(position.value, (int, float))
+        ):
+            raise ValidationError(detail="Invalid cursor")
+
+        ranked = self._ranked_matches(db, q)
+        stmt = (
+            select(Item, ranked.c.rank, ranked.c.total)
+            .join(ranked, Item.id == ranked.c.id)
+            .order_by(ranked.c.rank, Item.id)
+            .limit(limit + 1)
+        )
+        if position is not None:
+            stmt = stmt.where(
+                or_(ranked.c.rank > position.value, and_(ranked.c.rank == position.value, ranked.c.id > position.id))
+            )
+        result = await db.execute(stmt)
+        fetched: List[Tuple[Any, ...]] = list(result.all())
+
+        total = int(fetched[0][2]) if fetched else 0
+        next_cursor = None
+        if len(fetched) > limit:
+            fetched = fetched[:limit]
+            last, rank, _ = fetched[-1]
+            next_cursor = encode_cursor(Cursor(sort="rank", value=rank, id=last.id, direction=NEXT))
+        return PageResult(
+            items=[row[0] for row in fetched], total=total, total_estimated=False, next=next_cursor, prev=None
+        )
 
 
 item = CRUDItem(Item)
@@ -1,36 +1,64 @@
-from typing import Optional
+from typing import Any, Dict, Optional, Union
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.security import get_password_hash, verify_password
+from app.core.security import get_password_hash_async, verify_password_async
+from app.core.user_cache import invalidate_user_snapshots
 from app.crud.base import CRUDBase
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
 
 
 class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
+    sortable_columns = ("id", "email")
+
+    async def _invalidate_cache(self, *ids: Any) -> None:
+        await super()._invalidate_cache(*ids)
+        # Bulk writes pass the ids they wrote too, so deactivations apply at once
+        await invalidate_user_snapshots(*ids)
+
     async def get_by_email(self, db: AsyncSession, *, email: str) -> Optional[User]:
         result = await db.execute(select(User).filter(User.email == email))
         return result.scalars().first()  # type: ignore
 
+    async def _prepare_row(self, obj_in: Union[UserCreate, Dict[str, Any]]) -> Dict[str, Any]:
+        if isinstance(obj_in, dict):
+            return obj_in
+        return {
+            "email": obj_in.email,
+            "hashed_password": await get_password_hash_async(obj_in.password),
+            "full_name": obj_in.full_name,
+            "is_active": obj_in.is_active,
+            "is_superuser": obj_in.is_superuser,
+        }
+
     async def create(self, db: AsyncSession, *, obj_in: UserCreate) -> User:
-        db_obj = User(
-            email=obj_in.email,
-            hashed_password=get_password_hash(obj_in.password),
-            full_name=obj_in.full_name,
-            is_superuser=obj_in.is_superuser,
+        return await self._insert(
+            db,
+            {
+                "email": obj_in.email,
+                "hashed_password": await get_password_hash_async(obj_in.password),
+                "full_name": obj_in.full_name,
+                "is_superuser": obj_in.is_superuser,
+            },
         )
-        db.add(db_obj)
-        await db.commit()
-        await db.refresh(db_obj)
-        return db_obj
+
+    async def update(self, db: AsyncSession, *, db_obj: User, obj_in: Union[UserUpdate, Dict[str, Any]]) -> User:
+        if isinstance(obj_in, dict):
+            update_data = dict(obj_in)
+        else:
+            update_data = obj_in.model_dump(exclude_unset=True)
+        password = update_data.pop("password", None)
+        if password:
+            update_data["hashed_password"] = await get_password_hash_async(password)
+        return await super().update(db, db_obj=db_obj, obj_in=update_data)  # type: ignore
 
     async def authenticate(self, db: AsyncSession, *, email: str, password: str) -> Optional[User]:
         user = await self.get_by_email(db, email=email)
         if not user:
             return None
-        if not verify_password(password, str(user.hashed_password)):
+        if not await verify_password_async(password, str(user.hashed_password)):
             return None
         return user
 
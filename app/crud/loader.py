@@ -0,0 +1,78 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+
+class _Batch:
+    def __init__(self) -> None:
+        self.ids: List[int] = []
+        self.futures: Dict[int, "asyncio.Future[Any]"] = {}
+
+    def add(self, id: int) -> None:
+        if id not in self.ids:
+            self.ids.append(id)
+
+    def future_for(self, id: int) -> "asyncio.Future[Any]":
+        self.add(id)
+        if id not in self.futures:
+            self.futures[id] = asyncio.get_running_loop().create_future()
+        return self.futures[id]
+
+
+class _LeaderCancelledError(Exception):
+    """
+    The coroutine running a batch was cancelled: the others look their rows up again.
+    """
+
+
+class BatchLoader:
+    """
+    DataLoader-style batching of primary key lookups.
+
+    The first `load` on a session waits one event-loop tick, during which every other
+    coroutine that calls `load` with the same session (e.g. `asyncio.gather` in one handler)
+    joins its batch; then it runs a single `WHERE id IN (...)` query for all of them.
+
+    Batches never span sessions: every caller gets objects from its own identity map and
+    transaction, never another request's (possibly stale or uncommitted) copy.
+    """
+
+    def __init__(self, model: Any) -> None:
+        self.model = model
+        self._pending: Dict[AsyncSession, _Batch] = {}
+
+    async def load(self, db: AsyncSession, id: int) -> Optional[Any]:
+        batch = self._pending.get(db)
+        if batch is not None:
+            try:
+                # Shielded so that a cancelled caller does not cancel a future shared with others
+                return await asyncio.shield(batch.future_for(id))
+            except _LeaderCancelledError:
+                return await self.load(db, id)
+
+        batch = _Batch()
+        batch.add(id)
+        self._pending[db] = batch
+        try:
+            # Let the coroutines scheduled for this tick join the batch
+            await asyncio.sleep(0)
+            del self._pending[db]
+            result = await db.execute(select(self.model).where(self.model.id.in_(batch.ids)))
+            found = {obj.id: obj for obj in result.scalars().all()}
+        except BaseException as e:
+            if self._pending.get(db) is batch:
+                del self._pending[db]
+            error = e if isinstance(e, Exception) else _LeaderCancelledError()
+            for future in batch.futures.values():
+                if not future.done():
+                    future.set_exception(error)
+                    # Mark retrieved: the waiters may be gone too
+                    future.exception()
+            raise
+
+        for key, future in batch.futures.items():
+            if not future.done():
+                future.set_result(found.get(key))
+        return found.get(id)
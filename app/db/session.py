@@ -1,29 +1,117 @@
-from typing import Any, AsyncGenerator, Dict
+import itertools
+import time
+from typing import Any, AsyncGenerator, Dict, List
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.core.logger import logger
 
-# Construct engine arguments based on database type
-engine_args: Dict[str, Any] = {
-    "echo": settings.DEBUG,
-    "future": True,
-}
 
-if "sqlite" in settings.DATABASE_URL:
-    engine_args["connect_args"] = {"check_same_thread": False}
-else:
-    engine_args["pool_size"] = settings.DB_POOL_SIZE
-    engine_args["max_overflow"] = settings.DB_MAX_OVERFLOW
-    engine_args["pool_timeout"] = settings.DB_POOL_TIMEOUT
-    engine_args["pool_recycle"] = settings.DB_POOL_RECYCLE
+def engine_args(url: str) -> Dict[str, Any]:
+    """
+    Construct engine arguments based on database type
+    """
+    args: Dict[str, Any] = {
+        "echo": settings.DEBUG,
+        "future": True,
+    }
 
-engine = create_async_engine(settings.DATABASE_URL, **engine_args)
+    if "sqlite" in url:
+        args["connect_args"] = {"check_same_thread": False}
+    else:
+        args["pool_size"] = settings.DB_POOL_SIZE
+        args["max_overflow"] = settings.DB_MAX_OVERFLOW
+        args["pool_timeout"] = settings.DB_POOL_TIMEOUT
+        args["pool_recycle"] = settings.DB_POOL_RECYCLE
+    return args
+
+
+engine = create_async_engine(settings.DATABASE_URL, **engine_args(settings.DATABASE_URL))
 
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
+class Replica:
+    def __init__(self, url: str) -> None:
+        args = engine_args(url)
+        if "pool_timeout" in args:
+            # There is somewhere else to read from, so an exhausted pool should not hold the request up for long
+            args["pool_timeout"] = settings.DB_REPLICA_POOL_TIMEOUT
+        self.engine: AsyncEngine = create_async_engine(url, **args)
+        self.session_factory: async_sessionmaker[AsyncSession] = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.down_until = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def mark_down(self) -> None:
+        self.down_until = time.monotonic() + settings.DB_REPLICA_RETRY_INTERVAL
+
+
+class ReplicaPool:
+    """
+    Round-robin over the read replicas, skipping the ones that recently failed to connect.
+    """
+
+    def __init__(self, urls: List[str]) -> None:
+        self.replicas = [Replica(url) for url in urls]
+        self._counter = itertools.count()
+
+    def candidates(self) -> List[Replica]:
+        if not self.replicas:
+            return []
+        start = next(self._counter) % len(self.replicas)
+        rotated = self.replicas[start:] + self.replicas[:start]
+        return [replica for replica in rotated if replica.healthy]
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+replicas = ReplicaPool(settings.DATABASE_REPLICA_URLS)
+
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:  # type: ignore
         yield session
+
+
+async def open_read_session() -> AsyncSession:
+    """
+    Session on a healthy read replica with a connection already checked out, or on the primary when none is.
+    """
+    for replica in replicas.candidates():
+        session = replica.session_factory()
+        try:
+            # Check out a connection up front so a dead replica fails over before the handler runs
+            await session.connection()
+        except (DBAPIError, OSError) as e:
+            await session.close()
+            replica.mark_down()
+            logger.warning(f"Read replica {replica.engine.url!r} unavailable, skipping it: {e}")
+            continue
+        except PoolTimeoutError as e:
+            # Busy rather than down: every pooled connection is checked out, so try the next one
+            await session.close()
+            logger.warning(f"Read replica {replica.engine.url!r} has no free connection, skipping it: {e}")
+            continue
+        return session
+    primary: AsyncSession = AsyncSessionLocal()
+    return primary
+
+
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session for read-only handlers: a healthy read replica when any are configured, the primary otherwise.
+
+    Replicas may lag behind the primary, so flows that must see their own writes should keep using `get_db`.
+    Endpoints with cached or versioned responses use `deps.get_cacheable_read_db` / `deps.get_etag_read_db`.
+    """
+    async with await open_read_session() as session:
+        yield session
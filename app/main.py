@@ -1,16 +1,16 @@
+import asyncio
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator, Dict
 
 import sentry_sdk
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import ORJSONResponse
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
+from slowapi.middleware import SlowAPIASGIMiddleware
 from sqlalchemy import text
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
@@ -24,10 +24,15 @@ from app.core.errors import (
 )
 from app.core.exceptions import AppError
 from app.core.logger import logger
+from app.core.metrics import mark_worker_dead, remove_dead_workers
 from app.core.rate_limit import limiter
+from app.core.redis import close_redis, create_redis
 from app.core.telemetry import setup_opentelemetry
+from app.core.warmup import warm_up
 from app.core.watcher import start_config_watcher
-from app.db.session import engine
+from app.db.session import engine, replicas
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.load_shedding import LoadSheddingMiddleware
 from app.middleware.monitoring import PrometheusMiddleware, metrics_endpoint
 from app.middleware.request_id import RequestIDMiddleware
 from app.middleware.security import SecurityHeadersMiddleware
@@ -40,31 +45,49 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     # Start config watcher
     observer = start_config_watcher()
 
+    # Multiprocess metrics: forget the gauges of workers that were killed
+    remove_dead_workers()
+
+    # Shared Redis client, one pool for the whole process
+    app.state.redis = create_redis()
+
     # Initialize Cache
+    cache_backend = None
     if settings.CACHE_ENABLED:
-        try:
-            from fastapi_cache import FastAPICache
-            from fastapi_cache.backends.redis import RedisBackend
-            from redis import asyncio as aioredis
+        from fastapi_cache import FastAPICache
+
+        from app.core.cache_backend import TieredBackend
 
-            redis = aioredis.from_url(settings.REDIS_URL, encoding="utf8", decode_responses=True)
-            FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
-            logger.info("Cache initialized with Redis")
+        try:
+            cache_backend = TieredBackend(app.state.redis)
+            await cache_backend.start()
+            logger.info("Cache initialized with Redis and a local LRU")
         except Exception as e:
             logger.warning(f"Failed to initialize cache: {e}")
-            # Fallback to in-memory cache for testing or if Redis fails
-            from fastapi_cache import FastAPICache
-            from fastapi_cache.backends.inmemory import InMemoryBackend
+            # Fallback to the bounded local tier alone for testing or if Redis fails
+            cache_backend = TieredBackend()
+            logger.info("Cache initialized with a local LRU only")
+        FastAPICache.init(cache_backend, prefix="fastapi-cache")
 
-            FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
-            logger.info("Cache initialized with InMemoryBackend")
+    # Not ready until the pools and caches are warm (in the background, so /healthz answers meanwhile)
+    warmup_task = None
+    if settings.WARMUP_ENABLED:
+        app.state.ready = False
+        warmup_task = asyncio.create_task(warm_up(app))
 
     yield
 
     # Cleanup if needed
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
     if observer:
         observer.stop()
         observer.join()
+    if cache_backend is not None:
+        await cache_backend.stop()
+    await close_redis(app.state.redis)
+    await replicas.dispose()
+    mark_worker_dead()
     logger.info("Application shutting down...")
 
 
@@ -102,13 +125,17 @@ def create_app() -> FastAPI:
 
     app.state.limiter = limiter
     app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)  # type: ignore
-    app.add_middleware(SlowAPIMiddleware)
+    app.add_middleware(SlowAPIASGIMiddleware)
 
     # Trusted Host
     app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
 
-    # GZip
-    app.add_middleware(GZipMiddleware, minimum_size=1000)
+    # zstd/br/gzip, negotiated per request
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+
+    # Shed load before it queues for database connections; rejections still get the headers added below
+    if settings.LOAD_SHEDDING_ENABLED:
+        app.add_middleware(LoadSheddingMiddleware)
 
     # Request ID
     app.add_middleware(RequestIDMiddleware)
@@ -152,7 +179,7 @@ def create_app() -> FastAPI:
         return {"message": f"Welcome to {settings.APP_NAME}"}
 
     @app.get("/healthz", tags=["health"])
-    async def healthz() -> Dict[str, str]:
+    async def healthz(request: Request) -> Dict[str, str]:
         # Basic DB check
         try:
             async with engine.connect() as conn:
@@ -164,13 +191,10 @@ def create_app() -> FastAPI:
 
         # Redis check
         redis_status = "n/a"
-        if settings.CACHE_ENABLED:
+        redis = getattr(request.app.state, "redis", None)
+        if settings.CACHE_ENABLED and redis is not None:
             try:
-                from redis import asyncio as aioredis
-
-                redis = aioredis.from_url(settings.REDIS_URL, encoding="utf8", decode_responses=True)
                 await redis.ping()
-                await redis.close()
                 redis_status = "ok"
             except Exception as e:
                 logger.error(f"Redis health check failed: {e}")
@@ -184,6 +208,13 @@ def create_app() -> FastAPI:
             "redis": redis_status,
         }
 
+    @app.get("/readyz", tags=["health"], responses={503: {"description": "Warming up"}})
+    async def readyz(request: Request) -> ORJSONResponse:
+        # Without lifespan (e.g. tests) there is nothing to warm up
+        if not getattr(request.app.state, "ready", True):
+            return ORJSONResponse({"status": "warming_up"}, status_code=503)
+        return ORJSONResponse({"status": "ready"})
+
     return app
 
 
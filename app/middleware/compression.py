@@ -0,0 +1,60 @@
+from typing import Optional
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES, IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.compression import StreamCompressor, negotiate
+from app.core.config import settings
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with the best of zstd, br and gzip the client accepts.
+
+    Small bodies, excluded media types (already compressed ones, event streams) and responses that
+    already have a Content-Encoding, such as compressed bodies served from the response cache,
+    are sent as they are.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1000) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        responder: ASGIApp
+        if encoding is not None:
+            responder = CompressionResponder(self.app, self.minimum_size, encoding)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+        await responder(scope, receive, send)
+
+
+class CompressionResponder(IdentityResponder):
+    """
+    Starlette's GZip responder logic (exclusions, Vary, streaming) with any coding of `app.core.compression`.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int, encoding: str) -> None:
+        super().__init__(app, minimum_size, exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES)
+        self.content_encoding = encoding
+        self._compressor: Optional[StreamCompressor] = None
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = StreamCompressor(self.content_encoding)
+            # A strong ETag names one byte sequence, so the encoded body only keeps a weak one
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            etag = headers.get("etag")
+            if etag is not None and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+        if len(body) >= settings.COMPRESSION_THREAD_MIN_SIZE:
+            # Compressing large chunks inline would block the event loop
+            return await anyio.to_thread.run_sync(self._compressor.compress, body, not more_body)
+        return self._compressor.compress(body, final=not more_body)
@@ -0,0 +1,130 @@
+"""
+Admission control: an adaptive limit on the requests a worker processes at once.
+
+When the database slows down, requests would otherwise queue for a pool connection (up to
+`DB_POOL_TIMEOUT`) and latency grows for everyone. Instead, requests over the limit get an
+immediate 503 with Retry-After, and the limit follows the observed latency.
+"""
+
+import math
+import time
+from typing import Iterable, Optional
+
+from prometheus_client import Counter, Gauge
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+CONCURRENCY_LIMIT = Gauge(
+    "http_concurrency_limit", "Requests a worker currently admits at once", multiprocess_mode="livesum"
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Admitted requests being processed", multiprocess_mode="livesum")
+REQUESTS_REJECTED = Counter("http_requests_rejected_total", "Requests rejected by load shedding")
+
+EXEMPT_PATHS = ("/healthz", "/readyz", "/metrics")
+
+
+class GradientLimit:
+    """
+    Concurrency limit in the style of Netflix's Gradient2.
+
+    Compares a short-term average of the latency with a long-term one. While they are close, the
+    limit grows by about its square root per sample; when latency rises, it shrinks in proportion,
+    by half at most. It only grows while the current limit is actually used.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2,
+        short_window: int = 10,
+        long_window: int = 600,
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self._short_alpha = 2 / (short_window + 1)
+        self._long_alpha = 2 / (long_window + 1)
+        self._short_rtt: Optional[float] = None
+        self._long_rtt: Optional[float] = None
+
+    def update(self, rtt: float, in_flight: int) -> float:
+        """
+        Record the latency of one request, with the number of requests in flight when it finished.
+        """
+        if self._short_rtt is None or self._long_rtt is None:
+            self._short_rtt = self._long_rtt = rtt
+            return self.limit
+        self._short_rtt += (rtt - self._short_rtt) * self._short_alpha
+        self._long_rtt += (rtt - self._long_rtt) * self._long_alpha
+        # After a long slowdown, let the baseline come back down quickly
+        if self._long_rtt / self._short_rtt > 2:
+            self._long_rtt *= 0.95
+
+        # Mostly idle: latency says nothing about whether more would fit
+        if in_flight < self.limit / 2:
+            return self.limit
+
+        gradient = max(0.5, min(1.0, self.tolerance * self._long_rtt / self._short_rtt))
+        new_limit = self.limit * gradient + math.sqrt(self.limit)
+        new_limit = self.limit * (1 - self.smoothing) + new_limit * self.smoothing
+        self.limit = max(float(self.min_limit), min(float(self.max_limit), new_limit))
+        return self.limit
+
+
+class LoadSheddingMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        limit: Optional[GradientLimit] = None,
+        exempt_paths: Iterable[str] = EXEMPT_PATHS,
+    ) -> None:
+        self.app = app
+        self.limit = limit or GradientLimit(
+            settings.CONCURRENCY_LIMIT_INITIAL, settings.CONCURRENCY_LIMIT_MIN, settings.CONCURRENCY_LIMIT_MAX
+        )
+        self.exempt_paths = frozenset(exempt_paths)
+        self.in_flight = 0
+        CONCURRENCY_LIMIT.set(int(self.limit.limit))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        if self.in_flight >= int(self.limit.limit):
+            REQUESTS_REJECTED.inc()
+            response = JSONResponse(
+                {"detail": "Server is overloaded, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(settings.LOAD_SHEDDING_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+
+        self.in_flight += 1
+        REQUESTS_IN_FLIGHT.inc()
+        start_time = time.perf_counter()
+        # Latency up to the response headers: a long streamed body is not a slow server
+        rtt: Optional[float] = None
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal rtt
+            if message["type"] == "http.response.start":
+                rtt = time.perf_counter() - start_time
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if rtt is None:
+                rtt = time.perf_counter() - start_time
+            CONCURRENCY_LIMIT.set(int(self.limit.update(rtt, self.in_flight)))
+            self.in_flight -= 1
+            REQUESTS_IN_FLIGHT.dec()
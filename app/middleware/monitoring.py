@@ -1,10 +1,11 @@
 import time
-from typing import Awaitable, Callable
 
 from fastapi import Request
 from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import metrics_registry
 
 # Define metrics
 REQUEST_COUNT = Counter("http_requests_total", "Total number of HTTP requests", ["method", "endpoint", "status_code"])
@@ -12,33 +13,42 @@ REQUEST_COUNT = Counter("http_requests_total", "Total number of HTTP requests",
 REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency in seconds", ["method", "endpoint"])
 
 
-class PrometheusMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
-        start_time = time.time()
+class PrometheusMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        # Stays 500 if the application raises before starting a response
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
 
-        # Process request
         try:
-            response = await call_next(request)
-            status_code = response.status_code
-        except Exception:
-            status_code = 500
-            raise
+            await self.app(scope, receive, send_with_status)
         finally:
-            process_time = time.time() - start_time
+            process_time = time.perf_counter() - start_time
 
             # Record metrics
             # Use path template to avoid high cardinality (e.g., /items/{id} instead of /items/1)
             # Fallback to path if template not available
-            endpoint = request.url.path
-            if request.scope.get("route"):
-                endpoint = request.scope["route"].path
-
-            REQUEST_COUNT.labels(method=request.method, endpoint=endpoint, status_code=status_code).inc()
+            route = scope.get("route")
+            endpoint = route.path if route is not None else scope["path"]
+            method = scope["method"]
 
-            REQUEST_LATENCY.labels(method=request.method, endpoint=endpoint).observe(process_time)
+            REQUEST_COUNT.labels(method=method, endpoint=endpoint, status_code=status_code).inc()
 
-        return response
+            REQUEST_LATENCY.labels(method=method, endpoint=endpoint).observe(process_time)
 
 
 def metrics_endpoint(request: Request) -> Response:
-    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    # Plain function: Starlette runs it in the threadpool, off the event loop, while it reads the metric files
+    return Response(generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import DDL, Column, Integer, String, event
 
 from app.db.base import Base
 
@@ -8,4 +8,84 @@ class Item(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
-    description = Column(String, index=True)
+    # Searched through the full-text index below, a B-tree index does not help substring/word lookups
+    description = Column(String)
+
+
+# Full-text search index, kept in sync with `items` by triggers.
+# Shared with migration 5c0f3e8a1d27 so `Base.metadata.create_all` (tests, local dev) builds the same schema.
+# None of it is declared on the model: migrations/env.py keeps autogenerate from dropping it.
+SQLITE_FTS_TABLE = "items_fts"
+
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(title, description, content='items', content_rowid='id')",
+    # Rank title matches above description matches, like the 'A'/'B' weights on Postgres
+    "INSERT INTO items_fts(items_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+    """CREATE TRIGGER items_fts_ai AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER items_fts_ad AFTER DELETE ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER items_fts_au AFTER UPDATE ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO items_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+]
+
+SQLITE_FTS_DROP_DDL = [
+    "DROP TRIGGER IF EXISTS items_fts_au",
+    "DROP TRIGGER IF EXISTS items_fts_ad",
+    "DROP TRIGGER IF EXISTS items_fts_ai",
+    "DROP TABLE IF EXISTS items_fts",
+]
+
+POSTGRES_SEARCH_VECTOR = "search_vector"
+POSTGRES_SEARCH_VECTOR_INDEX = "ix_items_search_vector"
+
+POSTGRES_FTS_TRIGGER_DDL = [
+    """CREATE OR REPLACE FUNCTION items_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A')
+            || setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE TRIGGER items_search_vector_trigger BEFORE INSERT OR UPDATE OF title, description ON items
+    FOR EACH ROW EXECUTE FUNCTION items_search_vector_update()""",
+]
+
+POSTGRES_FTS_DROP_DDL = [
+    "DROP TRIGGER IF EXISTS items_search_vector_trigger ON items",
+    "DROP FUNCTION IF EXISTS items_search_vector_update()",
+]
+
+POSTGRES_FTS_DDL = [
+    "ALTER TABLE items ADD COLUMN search_vector tsvector",
+    "CREATE INDEX ix_items_search_vector ON items USING gin (search_vector)",
+    *POSTGRES_FTS_TRIGGER_DDL,
+]
+
+
+def is_search_index_object(name: str, type_: str) -> bool:
+    """
+    Whether a reflected schema object belongs to the full-text index (FTS5 keeps its data in `items_fts_*` tables).
+    """
+    if type_ == "table":
+        return name == SQLITE_FTS_TABLE or name.startswith(f"{SQLITE_FTS_TABLE}_")
+    if type_ == "column":
+        return name == POSTGRES_SEARCH_VECTOR
+    if type_ == "index":
+        return name == POSTGRES_SEARCH_VECTOR_INDEX
+    return False
+
+
+for _statement in SQLITE_FTS_DDL:
+    event.listen(Item.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+for _statement in POSTGRES_FTS_DDL:
+    event.listen(Item.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+for _statement in SQLITE_FTS_DROP_DDL:
+    event.listen(Item.__table__, "before_drop", DDL(_statement).execute_if(dialect="sqlite"))
@@ -1,4 +1,4 @@
-from typing import Generic, Sequence, TypeVar
+from typing import Generic, Optional, Sequence, TypeVar
 
 from pydantic import BaseModel, ConfigDict
 
@@ -15,7 +15,14 @@ class ResponseBase(BaseModel, Generic[T]):
 class Page(BaseModel, Generic[T]):
     items: Sequence[T]
     total: int
-    page: int
+    total_estimated: bool = False
+    page: Optional[int] = None
     size: int
+    next: Optional[str] = None
+    prev: Optional[str] = None
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class BulkResult(BaseModel):
+    count: int
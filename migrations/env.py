@@ -1,5 +1,6 @@
 import asyncio
 from logging.config import fileConfig
+from typing import Any, Optional
 
 from alembic import context
 from sqlalchemy import pool
@@ -11,6 +12,7 @@ from app.core.config import settings
 
 # Import Base and settings
 from app.db.base import Base
+from app.models.item import is_search_index_object
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -28,6 +30,16 @@ if config.config_file_name is not None:
 # for 'autogenerate' support
 target_metadata = Base.metadata
 
+
+def include_object(object: Any, name: Optional[str], type_: str, reflected: bool, compare_to: Any) -> bool:
+    """
+    Keep autogenerate from dropping the full-text index, which is created by raw DDL rather than declared on a model.
+    """
+    if reflected and compare_to is None and name is not None and is_search_index_object(name, type_):
+        return False
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -51,6 +63,7 @@ def run_migrations_offline() -> None:
         url=url,
         target_metadata=target_metadata,
         literal_binds=True,
+        include_object=include_object,
         dialect_opts={"paramstyle": "named"},
     )
 
@@ -59,7 +72,7 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
 
     with context.begin_transaction():
         context.run_migrations()
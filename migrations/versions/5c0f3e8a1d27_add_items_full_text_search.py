@@ -0,0 +1,63 @@
+"""add_items_full_text_search
+
+Revision ID: 5c0f3e8a1d27
+Revises: aaedacb0070d
+Create Date: 2026-10-18 10:12:41.503117
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+from app.models.item import (
+    POSTGRES_FTS_DROP_DDL,
+    POSTGRES_FTS_TRIGGER_DDL,
+    POSTGRES_SEARCH_VECTOR,
+    POSTGRES_SEARCH_VECTOR_INDEX,
+    SQLITE_FTS_DDL,
+    SQLITE_FTS_DROP_DDL,
+)
+
+# revision identifiers, used by Alembic.
+revision: str = "5c0f3e8a1d27"
+down_revision: Union[str, Sequence[str], None] = "aaedacb0070d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_FTS_DDL:
+            op.execute(statement)
+        # Index the existing rows
+        op.execute("INSERT INTO items_fts(items_fts) VALUES ('rebuild')")
+    elif dialect == "postgresql":
+        op.add_column("items", sa.Column(POSTGRES_SEARCH_VECTOR, postgresql.TSVECTOR(), nullable=True))
+        for statement in POSTGRES_FTS_TRIGGER_DDL:
+            op.execute(statement)
+        # Backfill through the trigger, then index
+        op.execute("UPDATE items SET title = title")
+        op.create_index(POSTGRES_SEARCH_VECTOR_INDEX, "items", [POSTGRES_SEARCH_VECTOR], postgresql_using="gin")
+
+    # Superseded by the full-text index
+    op.drop_index(op.f("ix_items_description"), table_name="items")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f("ix_items_description"), "items", ["description"], unique=False)
+
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_FTS_DROP_DDL:
+            op.execute(statement)
+    elif dialect == "postgresql":
+        op.drop_index(POSTGRES_SEARCH_VECTOR_INDEX, table_name="items")
+        for statement in POSTGRES_FTS_DROP_DDL:
+            op.execute(statement)
+        op.drop_column("items", POSTGRES_SEARCH_VECTOR)
@@ -0,0 +1,71 @@
+"""
+Micro-benchmark of the per-request overhead of the middleware stack built by `create_app`.
+
+Sends the same request to a trivial async route of the application and of a bare FastAPI app,
+calling the ASGI apps directly (no server, no HTTP client).
+
+Usage: PYTHONPATH=. python scripts/bench_middleware.py [iterations]
+"""
+
+import asyncio
+import sys
+import time
+from typing import Any, Dict
+
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp, Message
+
+from app.main import create_app
+
+
+async def bench(asgi_app: ASGIApp, iterations: int) -> float:
+    scope: Dict[str, Any] = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/bench",
+        "raw_path": b"/bench",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"accept-encoding", b"gzip")],
+        "client": ("127.0.0.1", 12345),
+        "server": ("bench", 80),
+    }
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        pass
+
+    for _ in range(1000):
+        await asgi_app(dict(scope), receive, send)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await asgi_app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def main(iterations: int) -> None:
+    async def bench_route() -> Dict[str, str]:
+        return {"status": "ok"}
+
+    app = create_app()
+    app.add_api_route("/bench", bench_route)
+    # Only the middleware FastAPI always adds
+    bare_app = FastAPI(default_response_class=ORJSONResponse)
+    bare_app.add_api_route("/bench", bench_route)
+
+    bare = await bench(bare_app, iterations)
+    full = await bench(app, iterations)
+    print(f"GET /bench, {iterations} requests")
+    print(f"  bare FastAPI app: {bare:8.2f} us/request")
+    print(f"  create_app():     {full:8.2f} us/request")
+    print(f"  middleware stack: {full - bare:8.2f} us/request")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
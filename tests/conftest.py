@@ -5,9 +5,10 @@ from httpx import ASGITransport, AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
+from app.api.deps import get_cacheable_read_db, get_etag_read_db
 from app.db.base import Base
 from app.db.session import engine as global_engine
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db
 from app.main import create_app
 
 # Use an in-memory SQLite database for testing
@@ -17,13 +18,13 @@ TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 @pytest_asyncio.fixture(scope="function", autouse=True)
 async def init_cache():
     from fastapi_cache import FastAPICache
-    from fastapi_cache.backends.inmemory import InMemoryBackend
 
-    FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
+    from app.core.cache_backend import TieredBackend
+
+    FastAPICache.init(TieredBackend(), prefix="fastapi-cache")
+    # init is a no-op once the backend is set, and cache keys no longer depend on the per-test db session
+    await FastAPICache.clear()
     yield
-    # No explicit cleanup needed for in-memory backend in function scope
-    # But FastAPICache is global, so maybe we should reset?
-    # FastAPICache.reset() # method doesn't exist, but re-init overwrites
 
 
 @pytest_asyncio.fixture(scope="function", autouse=True)
@@ -66,6 +67,9 @@ async def client(db: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
 
     # Override the dependency with the testing session
     app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_read_db] = lambda: db
+    app.dependency_overrides[get_cacheable_read_db] = lambda: db
+    app.dependency_overrides[get_etag_read_db] = lambda: db
 
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as c:
@@ -1,6 +1,13 @@
+import asyncio
+import time
+from typing import cast
+
 import pytest
-from httpx import AsyncClient
+from fastapi import BackgroundTasks, FastAPI
+from httpx import ASGITransport, AsyncClient
 
+from app.core.cache import SingleFlight, cache
+from app.core.cache_backend import LocalCache, TieredBackend
 from app.core.config import settings
 
 
@@ -25,3 +32,234 @@ async def test_cached_endpoint(client: AsyncClient):
 
     # If we had a real Redis in CI, we could check keys.
     # For now, this ensures the integration doesn't break the app.
+
+
+@pytest.mark.asyncio
+async def test_singleflight_collapses_concurrent_calls():
+    flight = SingleFlight()
+    calls = 0
+
+    async def compute() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return 42
+
+    results = await asyncio.gather(*(flight.do("key", compute) for _ in range(10)))
+    assert results == [42] * 10
+    assert calls == 1
+
+    # Nothing is remembered once the call completes
+    assert await flight.do("key", compute) == 42
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_singleflight_shares_errors():
+    flight = SingleFlight()
+
+    async def fail() -> int:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(*(flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_cache_recomputes_once_on_concurrent_misses():
+    app = FastAPI()
+    calls = 0
+
+    @app.get("/numbers")
+    @cache(expire=60)
+    async def numbers(n: int = 3) -> dict:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"numbers": list(range(n))}
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        responses = await asyncio.gather(*(c.get("/numbers") for _ in range(10)))
+        assert calls == 1
+        assert all(r.json() == {"numbers": [0, 1, 2]} for r in responses)
+        assert sorted(r.headers["X-FastAPI-Cache"] for r in responses) == ["MISS"] * 10
+
+        response = await c.get("/numbers")
+        assert response.headers["X-FastAPI-Cache"] == "HIT"
+        assert calls == 1
+
+        # Different query parameters are different keys
+        response = await c.get("/numbers", params={"n": 2})
+        assert response.json() == {"numbers": [0, 1]}
+        assert calls == 2
+
+        response = await c.get("/numbers", headers={"If-None-Match": response.headers["ETag"]}, params={"n": 2})
+        assert response.status_code == 304
+
+
+def test_local_cache_evicts_least_recently_used():
+    local = LocalCache(max_entries=2, max_bytes=1024)
+    local.set("a", b"1", local_ttl=60)
+    local.set("b", b"2", local_ttl=60)
+    assert local.get("a") is not None
+    local.set("c", b"3", local_ttl=60)
+
+    assert local.get("b") is None
+    a, c = local.get("a"), local.get("c")
+    assert a is not None and a.value == b"1"
+    assert c is not None and c.value == b"3"
+
+
+def test_local_cache_is_bounded_in_bytes():
+    local = LocalCache(max_entries=10, max_bytes=10)
+    local.set("a", b"12345", local_ttl=60)
+    local.set("b", b"12345", local_ttl=60)
+    local.set("c", b"1", local_ttl=60)
+    assert local.get("a") is None
+    assert local.size == 6
+
+    # Larger than the whole cache: not stored at all
+    local.set("d", b"x" * 11, local_ttl=60)
+    assert local.get("d") is None
+    assert len(local) == 2
+
+
+def test_local_cache_expires_entries():
+    local = LocalCache(max_entries=10, max_bytes=1024)
+    local.set("a", b"1", local_ttl=0)
+    local.set("b", b"2", local_ttl=60, ttl=0)
+    assert local.get("a") is None
+    assert local.get("b") is None
+    assert len(local) == 0
+
+
+@pytest.mark.asyncio
+async def test_tiered_backend_applies_invalidations_from_other_workers():
+    backend = TieredBackend()
+    await backend.set("ns:a", b"1", 60)
+    await backend.set("ns:b", b"2", 60)
+    await backend.set("other", b"3", 60)
+    ttl, value = await backend.get_with_ttl("ns:a")
+    assert value == b"1" and 0 < ttl <= 60
+
+    backend._apply(b"another-worker key ns:a")
+    assert await backend.get("ns:a") is None
+    backend._apply(b"another-worker prefix ns:")
+    assert await backend.get("ns:b") is None
+    assert await backend.get("other") == b"3"
+
+    # Own messages are ignored
+    backend._apply(f"{backend._id} key other".encode())
+    assert await backend.get("other") == b"3"
+
+
+@pytest.mark.asyncio
+async def test_cache_serves_stale_while_revalidating():
+    app = FastAPI()
+    calls = 0
+
+    @app.get("/counter")
+    @cache(expire=1, stale_while_revalidate=60)
+    async def counter() -> dict:
+        nonlocal calls
+        calls += 1
+        return {"calls": calls}
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        response = await c.get("/counter")
+        assert response.headers["X-FastAPI-Cache"] == "MISS"
+        response = await c.get("/counter")
+        assert response.headers["X-FastAPI-Cache"] == "HIT"
+        assert "stale-while-revalidate=60" in response.headers["Cache-Control"]
+
+        await asyncio.sleep(1.1)
+        # Past the soft TTL: the old value right away, refreshed after the response
+        response = await c.get("/counter")
+        assert response.headers["X-FastAPI-Cache"] == "STALE"
+        assert response.json() == {"calls": 1}
+        assert calls == 2
+
+        response = await c.get("/counter")
+        assert response.headers["X-FastAPI-Cache"] == "HIT"
+        assert response.json() == {"calls": 2}
+
+
+@pytest.mark.asyncio
+async def test_stale_refresh_that_never_ran_is_scheduled_again(monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_LOCK_TIMEOUT", 0.2)
+    app = FastAPI()
+    calls = 0
+
+    @app.get("/counter")
+    @cache(expire=1, stale_while_revalidate=60)
+    async def counter() -> dict:
+        nonlocal calls
+        calls += 1
+        return {"calls": calls}
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        await c.get("/counter")
+        await asyncio.sleep(1.1)
+        with monkeypatch.context() as m:
+            # The refresh is scheduled, but never runs
+            m.setattr(BackgroundTasks, "add_task", lambda self, *args, **kwargs: None)
+            response = await c.get("/counter")
+            assert response.headers["X-FastAPI-Cache"] == "STALE"
+        assert calls == 1
+
+        await asyncio.sleep(0.3)
+        response = await c.get("/counter")
+        assert response.headers["X-FastAPI-Cache"] == "STALE"
+        assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_stores_compressed_response_bytes():
+    app = FastAPI()
+
+    @app.get("/large")
+    @cache(expire=60)
+    async def large() -> dict:
+        return {"items": [{"id": i, "title": f"Item {i}"} for i in range(200)]}
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+        await c.get("/large")
+
+        # The stored gzip body is sent as it is to clients accepting gzip
+        response = await c.get("/large", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["X-FastAPI-Cache"] == "HIT"
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert len(response.json()["items"]) == 200
+        gzip_etag = response.headers["ETag"]
+
+        # And decompressed for the others
+        response = await c.get("/large", headers={"Accept-Encoding": "identity"})
+        assert "Content-Encoding" not in response.headers
+        assert len(response.json()["items"]) == 200
+
+        # Only the identity body has a strong ETag; both still validate either way
+        assert gzip_etag == f"W/{response.headers['ETag']}"
+        response = await c.get("/large", headers={"Accept-Encoding": "gzip", "If-None-Match": gzip_etag})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == gzip_etag
+
+
+@pytest.mark.asyncio
+async def test_tag_versions_expire():
+    from fastapi_cache import FastAPICache
+
+    from app.core.cache import _tag_key, _tag_versions, invalidate_tags
+
+    local = cast(TieredBackend, FastAPICache.get_backend()).local
+    # Set by a write, or on first read: neither stays forever
+    await invalidate_tags("items:1")
+    await _tag_versions(["items:2"])
+    for tag in ("items:1", "items:2"):
+        entry = local.get(_tag_key(tag))
+        assert entry is not None
+        assert entry.expires_at - time.monotonic() == pytest.approx(settings.CACHE_TAG_TTL, abs=5)
@@ -0,0 +1,142 @@
+import gzip
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from app.core.compression import (
+    BROTLI,
+    GZIP,
+    ZSTD,
+    StreamCompressor,
+    available_encodings,
+    compress,
+    decompress,
+    negotiate,
+)
+from app.middleware.compression import CompressionMiddleware
+
+BODY = "x" * 5000
+
+
+def test_negotiate():
+    encodings = [ZSTD, BROTLI, GZIP]
+    # Server preference breaks ties
+    assert negotiate("gzip, br, zstd", encodings) == ZSTD
+    assert negotiate("gzip, br", encodings) == BROTLI
+    # Client q-values win
+    assert negotiate("zstd;q=0.5, gzip", encodings) == GZIP
+    assert negotiate("*", encodings) == ZSTD
+    assert negotiate("*, zstd;q=0", encodings) == BROTLI
+    assert negotiate("gzip;q=0", encodings) is None
+    assert negotiate(None, encodings) is None
+    assert negotiate("zstd", [GZIP]) is None
+
+
+@pytest.mark.parametrize("encoding", [GZIP, ZSTD, BROTLI])
+def test_round_trip(encoding):
+    assert encoding in available_encodings()
+    assert decompress(compress(BODY.encode(), encoding), encoding) == BODY.encode()
+
+
+@pytest.mark.parametrize("encoding", [GZIP, ZSTD, BROTLI])
+def test_stream_compressor_chunks_decode(encoding):
+    compressor = StreamCompressor(encoding)
+    first = compressor.compress(b"first ")
+    # Flushed: the first chunk decodes on its own
+    assert first
+    data = first + compressor.compress(b"second", final=True)
+    assert decompress(data, encoding) == b"first second"
+
+
+async def large(request):
+    return PlainTextResponse(BODY, headers={"ETag": '"large"'})
+
+
+async def small(request):
+    return PlainTextResponse("tiny")
+
+
+async def encoded(request):
+    # Like a pre-compressed body served from the response cache
+    return Response(gzip.compress(BODY.encode()), media_type="text/plain", headers={"Content-Encoding": "gzip"})
+
+
+async def image(request):
+    return Response(BODY.encode(), media_type="image/png")
+
+
+async def stream(request):
+    async def chunks():
+        for i in range(3):
+            yield f"chunk {i}\n" * 100
+
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+
+@pytest.fixture
+async def client():
+    app = Starlette(
+        routes=[
+            Route("/large", large),
+            Route("/small", small),
+            Route("/encoded", encoded),
+            Route("/image", image),
+            Route("/stream", stream),
+        ]
+    )
+    app.add_middleware(CompressionMiddleware, minimum_size=1000)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        yield c
+
+
+@pytest.mark.asyncio
+async def test_compresses_with_negotiated_coding(client: AsyncClient):
+    r = await client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in r.headers["Vary"]
+    assert int(r.headers["Content-Length"]) < len(BODY)
+    assert r.text == BODY
+    # The encoded body is not the one the strong ETag named
+    assert r.headers["ETag"] == 'W/"large"'
+
+    r = await client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in r.headers
+    assert r.text == BODY
+    assert r.headers["ETag"] == '"large"'
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("encoding", [ZSTD, BROTLI])
+async def test_prefers_zstd_and_brotli(client: AsyncClient, encoding: str):
+    headers = {"Accept-Encoding": f"gzip, {encoding}"}
+    for path, body in [("/large", BODY), ("/stream", "".join(f"chunk {i}\n" * 100 for i in range(3)))]:
+        async with client.stream("GET", path, headers=headers) as r:
+            assert r.headers["Content-Encoding"] == encoding
+            raw = b"".join([chunk async for chunk in r.aiter_raw()])
+        assert decompress(raw, encoding) == body.encode()
+
+
+@pytest.mark.asyncio
+async def test_skips_small_excluded_and_encoded_bodies(client: AsyncClient):
+    headers = {"Accept-Encoding": "gzip"}
+    r = await client.get("/small", headers=headers)
+    assert "Content-Encoding" not in r.headers
+
+    r = await client.get("/image", headers=headers)
+    assert "Content-Encoding" not in r.headers
+
+    # Not compressed a second time
+    r = await client.get("/encoded", headers=headers)
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert r.text == BODY
+
+
+@pytest.mark.asyncio
+async def test_compresses_streams(client: AsyncClient):
+    r = await client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in r.headers
+    assert r.text == "".join(f"chunk {i}\n" * 100 for i in range(3))
@@ -18,3 +18,87 @@ async def test_healthz(client: AsyncClient) -> None:
         # If redis is down or not configured in test env, overall status might be error
         # We accept this in local test environment where redis might not be running
         pass
+
+
+@pytest.mark.asyncio
+async def test_redis_pool_metrics(client: AsyncClient) -> None:
+    from app.core.redis import close_redis, create_redis
+
+    redis = create_redis()
+    try:
+        r = await client.get("/metrics")
+        assert 'redis_pool_connections{pool="app",state="in_use"} 0.0' in r.text
+        assert f'redis_pool_max_connections{{pool="app"}} {float(settings.REDIS_MAX_CONNECTIONS)}' in r.text
+    finally:
+        await close_redis(redis)
+
+
+@pytest.mark.asyncio
+async def test_readyz_waits_for_warm_up(client: AsyncClient) -> None:
+    from app.core.warmup import warm_up
+
+    app = client._transport.app  # type: ignore[attr-defined]
+    app.state.ready = False
+    r = await client.get("/readyz")
+    assert r.status_code == 503
+
+    await warm_up(app)
+    r = await client.get("/readyz")
+    assert r.status_code == 200
+
+    # The hot routes were requested in-process, so they are cached now
+    r = await client.get("/api/v1/items/")
+    assert r.headers["X-FastAPI-Cache"] == "HIT"
+
+
+@pytest.mark.asyncio
+async def test_middleware_headers_and_metrics(client: AsyncClient) -> None:
+    r = await client.get("/healthz", headers={"X-Request-ID": "test-request-id"})
+    assert r.headers["X-Request-ID"] == "test-request-id"
+    assert r.headers["X-Frame-Options"] == "DENY"
+    assert r.headers["Content-Security-Policy"] == "default-src 'self'"
+
+    r = await client.get("/healthz")
+    assert r.headers["X-Request-ID"]
+
+    await client.get(f"{settings.API_V1_STR}/items/999999")
+    r = await client.get("/metrics")
+    assert 'http_requests_total{endpoint="/healthz",method="GET",status_code="200"}' in r.text
+    # Labelled with the route template, not the requested path
+    assert '{item_id}",method="GET",status_code="404"' in r.text
+
+
+def test_multiprocess_metrics(tmp_path, monkeypatch) -> None:
+    import os
+    import subprocess
+    import sys
+
+    from prometheus_client import generate_latest
+
+    from app.core import metrics
+
+    # prepare_multiprocess_dir exports the directory to os.environ; restored after the test
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", "")
+    metrics.prepare_multiprocess_dir(str(tmp_path))
+    worker = (
+        "from prometheus_client import Counter, Gauge\n"
+        "Counter('mp_test_requests', 'Requests').inc()\n"
+        "Gauge('mp_test_in_flight', 'In flight', multiprocess_mode='livesum').set(1)\n"
+    )
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", worker], env=env, check=True)
+
+    output = generate_latest(metrics.metrics_registry()).decode()
+    assert "mp_test_requests_total 2.0" in output
+    assert "mp_test_in_flight 2.0" in output
+
+    # Both workers have exited: their gauges go, their counts stay
+    metrics.remove_dead_workers()
+    output = generate_latest(metrics.metrics_registry()).decode()
+    assert "mp_test_requests_total 2.0" in output
+    assert "mp_test_in_flight 2.0" not in output
+
+    # Started again: a clean slate
+    metrics.prepare_multiprocess_dir(str(tmp_path))
+    assert "mp_test_requests_total" not in generate_latest(metrics.metrics_registry()).decode()
@@ -35,3 +35,351 @@ async def test_read_items(client: AsyncClient):
     assert len(items) == 2
     assert items[0]["title"] == "Test Item 1"
     assert items[1]["title"] == "Test Item 2"
+
+
+@pytest.mark.asyncio
+async def test_read_items_cursor_pagination(client: AsyncClient):
+    for i in range(3):
+        await client.post("/api/v1/items/", json={"title": f"Item {i}"})
+
+    first = (await client.get("/api/v1/items/", params={"size": 2})).json()["data"]
+    assert [item["title"] for item in first["items"]] == ["Item 0", "Item 1"]
+    assert first["prev"] is None
+    assert first["next"]
+
+    second = (await client.get("/api/v1/items/", params={"size": 2, "cursor": first["next"]})).json()["data"]
+    assert [item["title"] for item in second["items"]] == ["Item 2"]
+    assert second["page"] is None
+    assert second["next"] is None
+    assert second["prev"]
+
+    back = (await client.get("/api/v1/items/", params={"size": 2, "cursor": second["prev"]})).json()["data"]
+    assert [item["title"] for item in back["items"]] == ["Item 0", "Item 1"]
+    assert back["prev"] is None
+
+
+@pytest.mark.asyncio
+async def test_read_items_invalid_cursor(client: AsyncClient):
+    response = await client.get("/api/v1/items/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_read_items_forged_cursor_value(client: AsyncClient):
+    from app.core.pagination import NEXT, Cursor, encode_cursor
+
+    # Well-formed, but the value is not a scalar of the sort column's type
+    for value in ({"a": 1}, [1], None, "1", True):
+        cursor = encode_cursor(Cursor(sort="id", value=value, id=1, direction=NEXT))
+        response = await client.get("/api/v1/items/", params={"cursor": cursor})
+        assert response.status_code == 400
+
+    cursor = encode_cursor(Cursor(sort="rank", value="low", id=1, direction=NEXT))
+    response = await client.get("/api/v1/items/search", params={"q": "apple", "cursor": cursor})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_read_items_estimated_total(client: AsyncClient):
+    from app.crud import base
+
+    base._count_cache.clear()
+    await client.post("/api/v1/items/", json={"title": "Item"})
+
+    exact = (await client.get("/api/v1/items/")).json()["data"]
+    assert exact["total"] == 1
+    assert exact["total_estimated"] is False
+
+    # Nothing to estimate from yet: the count is exact, and cached for the next request
+    counted = (await client.get("/api/v1/items/", params={"estimate_total": True})).json()["data"]
+    assert counted["total"] == 1
+    assert counted["total_estimated"] is False
+
+    await client.post("/api/v1/items/", json={"title": "Other item"})
+    estimated = (await client.get("/api/v1/items/", params={"estimate_total": True})).json()["data"]
+    assert estimated["total"] == 1
+    assert estimated["total_estimated"] is True
+
+
+@pytest.mark.asyncio
+async def test_create_items_bulk(client: AsyncClient):
+    payload = [{"title": f"Bulk {i}", "description": "bulk"} for i in range(5)]
+    response = await client.post("/api/v1/items/bulk", json=payload)
+    assert response.status_code == 200
+    assert response.json()["data"]["count"] == 5
+
+    result = (await client.get("/api/v1/items/", params={"size": 10})).json()["data"]
+    assert result["total"] == 5
+    assert [item["title"] for item in result["items"]] == [f"Bulk {i}" for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_export_items(client: AsyncClient):
+    import orjson
+
+    await client.post("/api/v1/items/bulk", json=[{"title": f"Export {i}"} for i in range(3)])
+
+    response = await client.get("/api/v1/items/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [orjson.loads(line) for line in response.content.splitlines()]
+    assert [row["title"] for row in rows] == ["Export 0", "Export 1", "Export 2"]
+
+    response = await client.get("/api/v1/items/export", headers={"Accept": "text/csv"})
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines[0] == "title,description,id"
+    assert len(lines) == 4
+
+
+@pytest.mark.asyncio
+async def test_item_update_and_remove(db):
+    from app import crud
+    from app.schemas.item import ItemCreate, ItemUpdate
+
+    item = await crud.item.create(db, obj_in=ItemCreate(title="Original", description="Keep me"))
+    assert item.id is not None
+
+    updated = await crud.item.update(db, db_obj=item, obj_in=ItemUpdate(title="Renamed"))
+    assert updated.id == item.id
+    assert updated.title == "Renamed"
+    assert updated.description == "Keep me"
+
+    item_id = int(item.id)
+    removed = await crud.item.remove(db, id=item_id)
+    assert removed.title == "Renamed"
+    assert await crud.item.get(db, id=item_id) is None
+    with pytest.raises(ValueError):
+        await crud.item.remove(db, id=item_id)
+
+
+@pytest.mark.asyncio
+async def test_search_items(client: AsyncClient):
+    await client.post(
+        "/api/v1/items/bulk",
+        json=[
+            {"title": "Red apple", "description": "Sweet fruit"},
+            {"title": "Green pear", "description": "Not an apple"},
+            {"title": "Blue car", "description": "Fast"},
+        ],
+    )
+
+    response = await client.get("/api/v1/items/search", params={"q": "apple", "size": 1})
+    assert response.status_code == 200
+    first = response.json()["data"]
+    assert first["total"] == 2
+    # The title match ranks above the description match
+    assert [item["title"] for item in first["items"]] == ["Red apple"]
+    assert first["next"]
+
+    second = (
+        await client.get("/api/v1/items/search", params={"q": "apple", "size": 1, "cursor": first["next"]})
+    ).json()["data"]
+    assert [item["title"] for item in second["items"]] == ["Green pear"]
+    assert second["next"] is None
+
+    injected = (await client.get("/api/v1/items/search", params={"q": 'car" OR "'})).json()["data"]
+    assert injected["total"] == 0
+
+
+@pytest.mark.asyncio
+async def test_autogenerate_keeps_search_index(db):
+    from alembic.autogenerate import compare_metadata
+    from alembic.migration import MigrationContext
+
+    from app.db.base import Base
+    from app.models.item import is_search_index_object
+
+    def include_object(object, name, type_, reflected, compare_to):
+        # Same filter as migrations/env.py
+        return not (reflected and compare_to is None and is_search_index_object(name, type_))
+
+    def diff(connection):
+        context = MigrationContext.configure(connection, opts={"include_object": include_object})
+        return compare_metadata(context, Base.metadata)
+
+    connection = await db.connection()
+    assert await connection.run_sync(diff) == []
+
+
+@pytest.mark.asyncio
+async def test_read_items_sparse_fieldset(client: AsyncClient):
+    created = (await client.post("/api/v1/items/", json={"title": "Sparse", "description": "Long text"})).json()["data"]
+
+    listed = (await client.get("/api/v1/items/", params={"fields": "id,title"})).json()["data"]
+    assert listed["items"] == [{"id": created["id"], "title": "Sparse"}]
+
+    detail = (await client.get(f"/api/v1/items/{created['id']}", params={"fields": "title"})).json()["data"]
+    assert detail == {"title": "Sparse"}
+
+    response = await client.get("/api/v1/items/", params={"fields": "id,secret"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_read_items_by_ids(client: AsyncClient):
+    await client.post("/api/v1/items/bulk", json=[{"title": f"Multi {i}"} for i in range(3)])
+
+    response = await client.get("/api/v1/items/", params={"ids": "3,1,42"})
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert [item["title"] for item in data["items"]] == ["Multi 2", "Multi 0"]
+    assert data["total"] == 2
+
+    response = await client.get("/api/v1/items/", params={"ids": "1,two"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_concurrent_gets_are_batched(db):
+    import asyncio
+
+    from sqlalchemy import event
+
+    from app import crud
+    from app.schemas.item import ItemCreate
+
+    await crud.item.create_many(db, objs_in=[ItemCreate(title=f"Batched {i}") for i in range(3)])
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        found = await asyncio.gather(*(crud.item.get(db, id=i) for i in (1, 2, 3, 99)))
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    assert [item.title if item else None for item in found] == ["Batched 0", "Batched 1", "Batched 2", None]
+    assert len(statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_batched_gets_stay_in_their_session(tmp_path):
+    import asyncio
+
+    from sqlalchemy import update
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from app import crud
+    from app.db.base import Base
+    from app.models.item import Item
+    from app.schemas.item import ItemCreate
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'loader.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    try:
+        async with session_factory() as stale, session_factory() as writer, session_factory() as fresh:
+            item = await crud.item.create(stale, obj_in=ItemCreate(title="Old"))
+            item_id = int(item.id)
+            await writer.execute(update(Item).where(Item.id == item_id).values(title="New"))
+            await writer.commit()
+
+            # `stale` still holds the old copy in its identity map; `fresh` must not be answered from it
+            from_stale, from_fresh = await asyncio.gather(
+                crud.item.get(stale, id=item_id), crud.item.get(fresh, id=item_id)
+            )
+            assert from_stale is item
+            assert from_fresh is not None and from_fresh is not item
+            assert from_fresh.title == "New"
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_batched_get_survives_cancelled_leader(db):
+    import asyncio
+
+    from app import crud
+    from app.schemas.item import ItemCreate
+
+    item = await crud.item.create(db, obj_in=ItemCreate(title="Batched"))
+    item_id = int(item.id)
+    leader = asyncio.create_task(crud.item.get(db, id=item_id))
+    follower = asyncio.create_task(crud.item.get(db, id=item_id))
+    # Both join the batch; the leader is still waiting for the tick to end
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    found = await follower
+    assert found is not None and found.title == "Batched"
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+
+@pytest.mark.asyncio
+async def test_item_writes_invalidate_cached_lists(client: AsyncClient, db):
+    from app import crud
+
+    await client.post("/api/v1/items/", json={"title": "First", "description": "Desc"})
+    response = await client.get("/api/v1/items/")
+    assert response.headers["X-FastAPI-Cache"] == "MISS"
+    response = await client.get("/api/v1/items/")
+    assert response.headers["X-FastAPI-Cache"] == "HIT"
+
+    await client.post("/api/v1/items/", json={"title": "Second", "description": "Desc"})
+    response = await client.get("/api/v1/items/")
+    assert response.headers["X-FastAPI-Cache"] == "MISS"
+    assert response.json()["data"]["total"] == 2
+
+    item_id = response.json()["data"]["items"][0]["id"]
+    await crud.item.remove(db, id=item_id)
+    response = await client.get("/api/v1/items/")
+    assert response.json()["data"]["total"] == 1
+
+
+@pytest.mark.asyncio
+async def test_read_item_conditional_get(client: AsyncClient, db):
+    from app import crud
+    from app.schemas.item import ItemUpdate
+
+    response = await client.post("/api/v1/items/", json={"title": "Polled", "description": "Desc"})
+    item_id = response.json()["data"]["id"]
+
+    response = await client.get(f"/api/v1/items/{item_id}")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert not etag.startswith("W/")
+
+    response = await client.get(f"/api/v1/items/{item_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+    # Another representation has another ETag
+    response = await client.get(f"/api/v1/items/{item_id}?fields=title", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+    # Writes change the version, and so the ETag
+    db_item = await crud.item.get(db, id=item_id)
+    assert db_item is not None
+    await crud.item.update(db, db_obj=db_item, obj_in=ItemUpdate(title="Changed"))
+    response = await client.get(f"/api/v1/items/{item_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_item_etag_survives_lost_tag_versions(client: AsyncClient, db):
+    from fastapi_cache import FastAPICache
+
+    from app import crud
+    from app.schemas.item import ItemUpdate
+
+    item_id = (await client.post("/api/v1/items/", json={"title": "v1"})).json()["data"]["id"]
+    etag = (await client.get(f"/api/v1/items/{item_id}")).headers["ETag"]
+    db_item = await crud.item.get(db, id=item_id)
+    assert db_item is not None
+    await crud.item.update(db, db_obj=db_item, obj_in=ItemUpdate(title="v2"))
+
+    # The tag versions are lost (a flushed Redis, a restarted worker), then the row changes again
+    await FastAPICache.clear()
+    await crud.item.update(db, db_obj=db_item, obj_in=ItemUpdate(title="v3"))
+    response = await client.get(f"/api/v1/items/{item_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["data"]["title"] == "v3"
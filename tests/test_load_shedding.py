@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from app.middleware.load_shedding import REQUESTS_REJECTED, GradientLimit, LoadSheddingMiddleware
+
+
+def test_gradient_limit_follows_latency():
+    limit = GradientLimit(initial=20, min_limit=5, max_limit=100)
+    # Saturated with steady latency: grows
+    for _ in range(50):
+        limit.update(0.01, in_flight=int(limit.limit))
+    grown = limit.limit
+    assert grown > 20
+
+    # Latency jumps: shrinks, but not below the minimum
+    for _ in range(50):
+        limit.update(0.5, in_flight=int(limit.limit))
+    assert limit.limit < grown / 2
+    for _ in range(500):
+        limit.update(5.0, in_flight=int(limit.limit))
+    assert limit.limit >= 5
+
+    # Mostly idle: does not grow
+    idle = GradientLimit(initial=20, min_limit=5, max_limit=100)
+    for _ in range(50):
+        idle.update(0.01, in_flight=1)
+    assert idle.limit == 20
+
+
+@pytest.mark.asyncio
+async def test_excess_requests_are_rejected():
+    release = asyncio.Event()
+
+    async def slow(request):
+        await release.wait()
+        return PlainTextResponse("done")
+
+    async def healthz(request):
+        return PlainTextResponse("ok")
+
+    app = Starlette(routes=[Route("/slow", slow), Route("/healthz", healthz)])
+    app.add_middleware(LoadSheddingMiddleware, limit=GradientLimit(initial=1, min_limit=1, max_limit=1))
+    rejected = REQUESTS_REJECTED._value.get()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        first = asyncio.create_task(client.get("/slow"))
+        await asyncio.sleep(0.05)
+
+        r = await client.get("/slow")
+        assert r.status_code == 503
+        assert r.headers["Retry-After"] == "1"
+        assert REQUESTS_REJECTED._value.get() == rejected + 1
+
+        # Health checks are always admitted
+        assert (await client.get("/healthz")).status_code == 200
+
+        release.set()
+        assert (await first).status_code == 200
+        # The slot is free again
+        assert (await client.get("/slow")).status_code == 200
@@ -47,3 +47,65 @@ async def test_login_access_token(client: AsyncClient, db_session: AsyncSession)
     tokens = response.json()
     assert "access_token" in tokens
     assert tokens["token_type"] == "bearer"
+
+
+@pytest.mark.asyncio
+async def test_password_hashing_runs_off_the_event_loop():
+    import asyncio
+
+    from app.core import security
+
+    ticks = 0
+
+    async def ticker() -> None:
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0)
+
+    task = asyncio.create_task(ticker())
+    hashed = await security.get_password_hash_async("secret")
+    task.cancel()
+    # The loop kept running other coroutines while bcrypt was hashing
+    assert ticks > 1
+
+    assert await security.verify_password_async("secret", hashed)
+    assert not await security.verify_password_async("wrong", hashed)
+    assert security.PASSWORD_HASH_JOBS.labels(state="queued")._value.get() == 0
+
+
+def test_decode_token_caches_verified_tokens(monkeypatch):
+    from datetime import timedelta
+
+    import jwt
+
+    from app.core import security
+
+    token = security.create_access_token(42)
+    assert security.decode_token(token).sub == "42"
+
+    calls = 0
+    original_decode = jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        return original_decode(*args, **kwargs)
+
+    monkeypatch.setattr(jwt, "decode", counting_decode)
+    payload = security.decode_token(token)
+    assert payload.sub == "42" and payload.type == "access"
+    assert calls == 0
+
+    # Verified again once the signing key changes, and rejected
+    monkeypatch.setattr(settings, "SECRET_KEY", "another-secret")
+    with pytest.raises(jwt.PyJWTError):
+        security.decode_token(token)
+    assert calls == 1
+
+    # Expired tokens are never served from the cache
+    expired = security.create_access_token(42, expires_delta=timedelta(seconds=-1))
+    with pytest.raises(jwt.ExpiredSignatureError):
+        security.decode_token(expired)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        security.decode_token(expired)
@@ -0,0 +1,225 @@
+import math
+import time
+from types import SimpleNamespace
+from typing import Dict, Tuple, cast
+
+import pytest
+import redis
+from httpx import AsyncClient
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+from redis.commands.core import Script
+
+from app.core import rate_limit
+from app.core.config import settings
+from app.core.rate_limit import LeasedRedisStorage, limiter
+
+
+class FakeLeaseScript:
+    """
+    Stands in for the Lua script: sliding windows on a fake clock, with the same lease, give-back
+    and denial arithmetic.
+    """
+
+    def __init__(self, retry_after_ms: int = 30000):
+        self.now = 0.0
+        self.counts: Dict[Tuple[str, int], int] = {}
+        self.calls = 0
+        self.retry_after_ms = retry_after_ms
+
+    def refund(self, keys, unspent):
+        for i in range(len(unspent) // 3):
+            hits, unspent_expiry, window_ttl = unspent[3 * i : 3 * i + 3]
+            window = int(self.now // unspent_expiry) - (window_ttl <= unspent_expiry * 1000)
+            counted = (keys[2 * i + 1], window)
+            self.counts[counted] = max(self.counts.get(counted, 0) - hits, 0)
+
+    def __call__(self, keys, args):
+        self.calls += 1
+        limit, expiry, amount, lease_fraction, *unspent = args
+        self.refund(keys[2:], unspent)
+
+        window, elapsed = divmod(self.now, expiry)
+        previous = self.counts.get((keys[1], int(window) - 1), 0)
+        current = self.counts.get((keys[1], int(window)), 0)
+        available = limit - math.floor(previous * (expiry - elapsed) / expiry) - current
+        if available < amount:
+            return [0, self.retry_after_ms, 0]
+        granted = amount + math.ceil((available - amount) * lease_fraction)
+        self.counts[(keys[1], int(window))] = current + granted
+        return [granted, 0, int((2 * expiry - elapsed) * 1000)]
+
+
+@pytest.fixture
+def leased_storage(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_LEASE_FRACTION", 0.5)
+    # Nothing connects until a command runs
+    storage = storage_from_string("leased+redis://localhost:6379/15")
+    assert isinstance(storage, LeasedRedisStorage)
+    script = FakeLeaseScript()
+    storage.lua_lease_sliding_window = cast(Script, script)
+    storage.lua_refund_leases = cast(Script, script.refund)
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=lambda: script.now))
+    # No timers on the fake clock: tests give leases back with `refund_expired_leases`
+    monkeypatch.setattr(storage, "_schedule_refund", lambda until: None)
+    return storage, script
+
+
+def test_leased_hits_are_admitted_locally(leased_storage):
+    storage, script = leased_storage
+    strategy = SlidingWindowCounterRateLimiter(storage)
+    item = parse("10/minute")
+
+    # 1 hit plus half of the 9 left, rounded up: 6 hits for one script call
+    assert all(strategy.hit(item, "client") for _ in range(6))
+    assert script.calls == 1
+    # The lease is per key
+    assert strategy.hit(item, "other-client")
+    assert script.calls == 2
+
+
+def test_denials_are_remembered(leased_storage):
+    storage, script = leased_storage
+    strategy = SlidingWindowCounterRateLimiter(storage)
+    item = parse("2/minute")
+
+    assert strategy.hit(item, "client")
+    assert strategy.hit(item, "client")
+    calls = script.calls
+    assert not strategy.hit(item, "client")
+    assert script.calls == calls + 1
+    # Refused without asking Redis again
+    assert not strategy.hit(item, "client")
+    assert script.calls == calls + 1
+
+
+def test_denials_expire(leased_storage):
+    storage, script = leased_storage
+    script.retry_after_ms = 0
+    strategy = SlidingWindowCounterRateLimiter(storage)
+    item = parse("1/minute")
+
+    assert strategy.hit(item, "client")
+    assert not strategy.hit(item, "client")
+    # Without a known retry time every denied hit asks again
+    assert not strategy.hit(item, "client")
+    assert script.calls == 3
+
+
+def test_slow_traffic_under_the_limit_is_never_denied(leased_storage):
+    storage, script = leased_storage
+    strategy = SlidingWindowCounterRateLimiter(storage)
+    item = parse("100/minute")
+
+    # 60 hits a minute: every lease expires unspent before the next hit
+    for _ in range(300):
+        assert strategy.hit(item, "client")
+        script.now += 1
+    # Only the 60 hits admitted in a full window stay counted
+    assert sum(count for (_, window), count in script.counts.items() if window == 3) == 60
+
+
+def test_unspent_leases_of_other_keys_are_given_back(leased_storage):
+    storage, script = leased_storage
+    strategy = SlidingWindowCounterRateLimiter(storage)
+    item = parse("10/minute")
+
+    assert strategy.hit(item, "client")
+    leased = dict(script.counts)
+    assert list(leased.values()) == [6]
+    script.now += 7
+    # The other key's check gives back the 5 hits "client" never spent
+    assert strategy.hit(item, "other-client")
+    assert all(script.counts[counted] == 1 for counted in leased)
+
+
+def test_unspent_leases_are_given_back_without_other_checks(leased_storage):
+    storage, script = leased_storage
+    strategy = SlidingWindowCounterRateLimiter(storage)
+    item = parse("10/minute")
+
+    assert strategy.hit(item, "client")
+    leased = dict(script.counts)
+    script.now += 7
+    storage.refund_expired_leases()
+    assert all(script.counts[counted] == 1 for counted in leased)
+    assert script.calls == 1
+
+
+@pytest.fixture
+def lua_storage(monkeypatch):
+    """
+    Leased storage running the real Lua scripts, on fakeredis.
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    monkeypatch.setattr(settings, "RATE_LIMIT_LEASE_FRACTION", 0.5)
+    pool = redis.ConnectionPool(connection_class=fakeredis.FakeConnection, server=fakeredis.FakeServer())
+    storage = LeasedRedisStorage("leased+redis://localhost:6379/15", connection_pool=pool)
+    yield storage
+    storage.reset()
+
+
+def _window_count(storage: LeasedRedisStorage, key: str) -> int:
+    return int(storage.get_connection().get(storage.prefixed_key(storage._current_window_key(key))) or 0)
+
+
+def test_lease_script_grants_leases_and_denies(lua_storage):
+    strategy = SlidingWindowCounterRateLimiter(lua_storage)
+    item = parse("10/minute")
+    key = item.key_for("client")
+
+    assert strategy.hit(item, "client")
+    # 1 hit plus half of the 9 left, rounded up, counted at once
+    assert _window_count(lua_storage, key) == 6
+    assert all(strategy.hit(item, "client") for _ in range(9))
+    assert _window_count(lua_storage, key) == 10
+    assert not strategy.hit(item, "client")
+    # The denial is remembered until the current window is shifted out
+    denied = lua_storage._leases[key]
+    assert denied.hits == 0 and denied.until - time.monotonic() > 50
+
+
+def test_lease_script_gives_back_unspent_leases(lua_storage, monkeypatch):
+    strategy = SlidingWindowCounterRateLimiter(lua_storage)
+    item = parse("10/minute")
+    key = item.key_for("client")
+    now = time.monotonic()
+
+    assert strategy.hit(item, "client")
+    assert _window_count(lua_storage, key) == 6
+    # Past the lease, well within the window
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=lambda: now + 7))
+    assert strategy.hit(item, "other-client")
+    assert _window_count(lua_storage, key) == 1
+
+
+def test_refund_timer_gives_back_leases_of_a_quiet_process(lua_storage, monkeypatch):
+    monkeypatch.setattr(rate_limit, "LEASE_REFUND_INTERVAL", 0.05)
+    strategy = SlidingWindowCounterRateLimiter(lua_storage)
+    # Leases last 0.1s
+    item = parse("100/10 seconds")
+    key = item.key_for("client")
+
+    assert strategy.hit(item, "client")
+    assert _window_count(lua_storage, key) == 51
+    deadline = time.monotonic() + 5
+    while _window_count(lua_storage, key) != 1 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert _window_count(lua_storage, key) == 1
+
+
+@pytest.mark.asyncio
+async def test_login_is_rate_limited(client: AsyncClient):
+    limiter.reset()
+    login_data = {"username": "nobody@example.com", "password": "wrong"}
+    try:
+        statuses = [
+            (await client.post(f"{settings.API_V1_STR}/login/access-token", data=login_data)).status_code
+            for _ in range(6)
+        ]
+    finally:
+        limiter.reset()
+    assert 429 not in statuses[:5]
+    assert statuses[5] == 429
@@ -0,0 +1,118 @@
+import time
+
+import pytest
+from fastapi_cache import FastAPICache
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.requests import Request
+
+from app.api.deps import get_cacheable_read_db, get_etag_read_db
+from app.core.config import settings
+from app.db import session as db_session
+from app.db.session import ReplicaPool, get_read_db
+
+
+@pytest.mark.asyncio
+async def test_get_read_db_falls_back_to_primary(monkeypatch):
+    """A replica that cannot be reached is skipped and the primary serves the read."""
+    pool = ReplicaPool(["sqlite+aiosqlite:////nonexistent-dir/replica.db"])
+    monkeypatch.setattr(db_session, "replicas", pool)
+
+    async for session in get_read_db():
+        assert session.bind is db_session.engine
+        assert (await session.execute(text("SELECT 1"))).scalar() == 1
+
+    assert not pool.replicas[0].healthy
+    assert pool.candidates() == []
+    await pool.dispose()
+
+
+@pytest.mark.asyncio
+async def test_get_read_db_skips_exhausted_replica(monkeypatch):
+    """A replica without a free pooled connection is skipped, but not marked down."""
+    pool = ReplicaPool(["sqlite+aiosqlite:///:memory:"])
+    monkeypatch.setattr(db_session, "replicas", pool)
+
+    class ExhaustedSession(AsyncSession):
+        async def connection(self, *args, **kwargs):
+            raise PoolTimeoutError("QueuePool limit reached")
+
+    replica = pool.replicas[0]
+    monkeypatch.setattr(replica, "session_factory", async_sessionmaker(replica.engine, class_=ExhaustedSession))
+    async for session in get_read_db():
+        assert session.bind is db_session.engine
+
+    assert replica.healthy
+    await pool.dispose()
+
+
+@pytest.mark.asyncio
+async def test_exhausted_replica_fails_over_quickly(monkeypatch, tmp_path):
+    """Waiting for a replica connection is capped at DB_REPLICA_POOL_TIMEOUT, not the primary's DB_POOL_TIMEOUT."""
+    engine_args = db_session.engine_args
+
+    def pooled_engine_args(url):
+        args = {"poolclass": AsyncAdaptedQueuePool, "pool_size": 1, "max_overflow": 0, "pool_timeout": 30}
+        return {**engine_args(url), **args}
+
+    monkeypatch.setattr(db_session, "engine_args", pooled_engine_args)
+    monkeypatch.setattr(settings, "DB_REPLICA_POOL_TIMEOUT", 0.1)
+    pool = ReplicaPool([f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}"])
+    monkeypatch.setattr(db_session, "replicas", pool)
+
+    async with pool.replicas[0].engine.connect():
+        started = time.monotonic()
+        async for session in get_read_db():
+            assert session.bind is db_session.engine
+        assert time.monotonic() - started < 5
+
+    await pool.dispose()
+
+
+@pytest.mark.asyncio
+async def test_replica_pool_round_robin():
+    pool = ReplicaPool(["sqlite+aiosqlite:///:memory:", "sqlite+aiosqlite:///:memory:"])
+    first, second = pool.candidates()[0], pool.candidates()[0]
+    assert first is not second
+    await pool.dispose()
+
+
+def _get_request(headers=()):
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": list(headers)})
+
+
+@pytest.mark.asyncio
+async def test_cacheable_read_db_uses_replica_only_for_uncached_responses(monkeypatch, tmp_path):
+    """Responses stored under tag versions are read from the primary, the others from a replica."""
+    pool = ReplicaPool([f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}"])
+    monkeypatch.setattr(db_session, "replicas", pool)
+    replica = pool.replicas[0]
+
+    async for session in get_cacheable_read_db(_get_request()):
+        assert session.bind is db_session.engine
+    async for session in get_cacheable_read_db(_get_request([(b"cache-control", b"no-store")])):
+        assert session.bind is replica.engine
+
+    monkeypatch.setattr(FastAPICache, "_enable", False)
+    async for session in get_cacheable_read_db(_get_request()):
+        assert session.bind is replica.engine
+    await pool.dispose()
+
+
+@pytest.mark.asyncio
+async def test_etag_read_db_uses_replica_only_without_versioned_etags(monkeypatch, tmp_path):
+    """Versioned ETags name the primary's version of a row, so only unversioned responses come from a replica."""
+    pool = ReplicaPool([f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}"])
+    monkeypatch.setattr(db_session, "replicas", pool)
+    replica = pool.replicas[0]
+
+    async for session in get_etag_read_db():
+        assert session.bind is db_session.engine
+
+    # Process-local tag versions with several workers: ETags are hashes of the body
+    monkeypatch.setattr(settings, "WORKERS", 2)
+    async for session in get_etag_read_db():
+        assert session.bind is replica.engine
+    await pool.dispose()
@@ -1,9 +1,12 @@
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud
 from app.core.config import settings
+from app.core.user_cache import get_user_snapshot, invalidate_user_snapshots
+from app.models.user import User
 from app.schemas.user import UserCreate
 
 
@@ -41,6 +44,17 @@ async def test_read_users_by_superuser(
     assert len(data) >= 2  # superuser + extra user
 
 
+@pytest.mark.asyncio
+async def test_read_users_forged_cursor_value(client: AsyncClient, superuser_token_headers: dict[str, str]) -> None:
+    from app.core.pagination import NEXT, Cursor, encode_cursor
+
+    for value in ({"a": 1}, 5):
+        cursor = encode_cursor(Cursor(sort="email", value=value, id=1, direction=NEXT))
+        params = {"cursor": cursor}
+        r = await client.get(f"{settings.API_V1_STR}/users/", headers=superuser_token_headers, params=params)
+        assert r.status_code == 400
+
+
 @pytest.mark.asyncio
 async def test_read_user_me(client: AsyncClient, superuser_token_headers: dict[str, str]) -> None:
     r = await client.get(f"{settings.API_V1_STR}/users/me", headers=superuser_token_headers)
@@ -48,3 +62,147 @@ async def test_read_user_me(client: AsyncClient, superuser_token_headers: dict[s
     current_user = r.json()["data"]
     assert current_user["is_superuser"] is True
     assert current_user["email"] == "admin@example.com"
+
+
+@pytest.mark.asyncio
+async def test_upsert_many_users(db: AsyncSession, monkeypatch: pytest.MonkeyPatch) -> None:
+    existing = await crud.user.create(
+        db, obj_in=UserCreate(email="bulk@example.com", password="password", full_name="Old")
+    )
+    invalidated: list[str] = []
+
+    async def record_tags(*tags: str) -> None:
+        invalidated.extend(tags)
+
+    monkeypatch.setattr("app.crud.base.invalidate_tags", record_tags)
+
+    written = await crud.user.upsert_many(
+        db,
+        objs_in=[
+            UserCreate(email="bulk@example.com", password="password", full_name="New"),
+            UserCreate(email="bulk2@example.com", password="password"),
+        ],
+        index_elements=["email"],
+        batch_size=1,
+    )
+    assert written == 2
+    assert await crud.user.count(db) == 2
+
+    db.expire_all()
+    user = await crud.user.get_by_email(db, email="bulk@example.com")
+    assert user
+    assert user.full_name == "New"
+    # The detail ETag of the updated row changes too
+    assert crud.user.row_cache_tag(existing.id) in invalidated
+
+
+@pytest.mark.asyncio
+async def test_export_users_by_superuser(client: AsyncClient, superuser_token_headers: dict[str, str]) -> None:
+    r = await client.get(f"{settings.API_V1_STR}/users/export", headers=superuser_token_headers)
+    assert r.status_code == 200
+    assert b"admin@example.com" in r.content
+    assert b"hashed_password" not in r.content
+
+
+@pytest.mark.asyncio
+async def test_update_user_password(
+    client: AsyncClient, superuser_token_headers: dict[str, str], db: AsyncSession
+) -> None:
+    user = await crud.user.create(db, obj_in=UserCreate(email="change@example.com", password="old-password"))
+
+    r = await client.put(
+        f"{settings.API_V1_STR}/users/{user.id}",
+        headers=superuser_token_headers,
+        json={"email": "change@example.com", "password": "new-password", "full_name": "Changed"},
+    )
+    assert r.status_code == 200
+    assert r.json()["data"]["full_name"] == "Changed"
+    assert await crud.user.authenticate(db, email="change@example.com", password="new-password")
+
+
+@pytest.mark.asyncio
+async def test_read_user_by_id_sparse_fieldset(
+    client: AsyncClient, superuser_token_headers: dict[str, str], db: AsyncSession
+) -> None:
+    user = await crud.user.create(db, obj_in=UserCreate(email="sparse@example.com", password="password"))
+
+    r = await client.get(
+        f"{settings.API_V1_STR}/users/{user.id}", headers=superuser_token_headers, params={"fields": "email"}
+    )
+    assert r.status_code == 200
+    assert r.json()["data"] == {"email": "sparse@example.com"}
+
+    r = await client.get(
+        f"{settings.API_V1_STR}/users/{user.id}", headers=superuser_token_headers, params={"fields": "hashed_password"}
+    )
+    assert r.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_read_user_conditional_get(client: AsyncClient, superuser_token_headers: dict):
+    response = await client.get("/api/v1/users/me", headers=superuser_token_headers)
+    user_id = response.json()["data"]["id"]
+
+    response = await client.get(f"/api/v1/users/{user_id}", headers=superuser_token_headers)
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    headers = {**superuser_token_headers, "If-None-Match": response.headers["ETag"]}
+    response = await client.get(f"/api/v1/users/{user_id}", headers=headers)
+    assert response.status_code == 304
+
+    # Updating the user changes the ETag
+    user_in = {"email": "admin@example.com", "full_name": "Admin"}
+    await client.put(f"/api/v1/users/{user_id}", headers=superuser_token_headers, json=user_in)
+    response = await client.get(f"/api/v1/users/{user_id}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["data"]["full_name"] == "Admin"
+
+    # Permissions are checked before answering 304
+    response = await client.get(f"/api/v1/users/{user_id}", headers={"If-None-Match": headers["If-None-Match"]})
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_current_user_is_cached_until_updated(client: AsyncClient, db: AsyncSession):
+    from app.core.security import create_access_token
+
+    user = await crud.user.create(db, obj_in=UserCreate(email="cached@example.com", password="password"))
+    headers = {"Authorization": f"Bearer {create_access_token(user.id)}"}
+    response = await client.get("/api/v1/users/me", headers=headers)
+    assert response.status_code == 200
+
+    # Changed behind CRUDUser's back: the cached snapshot is still used
+    await db.execute(update(User).where(User.id == user.id).values(full_name="Sneaky"))
+    await db.commit()
+    response = await client.get("/api/v1/users/me", headers=headers)
+    assert response.json()["data"]["full_name"] is None
+
+    # Deactivation through CRUDUser applies right away
+    await crud.user.update(db, db_obj=user, obj_in={"is_active": False})
+    response = await client.get("/api/v1/users/me", headers=headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_drops_only_the_written_snapshots(client: AsyncClient, db: AsyncSession) -> None:
+    from app.core.security import create_access_token
+
+    written = await crud.user.create(db, obj_in=UserCreate(email="written@example.com", password="password"))
+    other = await crud.user.create(db, obj_in=UserCreate(email="other@example.com", password="password"))
+    for user in (written, other):
+        headers = {"Authorization": f"Bearer {create_access_token(user.id)}"}
+        assert (await client.get("/api/v1/users/me", headers=headers)).status_code == 200
+    assert await get_user_snapshot(int(written.id)) is not None
+
+    await crud.user.upsert_many(
+        db,
+        objs_in=[{"email": "written@example.com", "hashed_password": written.hashed_password, "is_active": False}],
+        index_elements=["email"],
+    )
+    assert await get_user_snapshot(int(written.id)) is None
+    assert await get_user_snapshot(int(other.id)) is not None
+
+    # Without ids there is nothing to drop: no scan of every cached user
+    await invalidate_user_snapshots()
+    assert await get_user_snapshot(int(other.id)) is not None